@@ -0,0 +1,19 @@
+"""Access control for the /admin endpoints.
+
+They are off unless ADMIN_TOKEN is set. Callers then send `Authorization: Bearer <token>`.
+"""
+import functools
+import hmac
+from flask import current_app, jsonify, request
+
+
+def admin_required(view):
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        token = current_app.config["ADMIN_TOKEN"]
+        if not token:
+            return jsonify({"message": "Admin endpoints are disabled (set ADMIN_TOKEN)."}), 404
+        if not hmac.compare_digest(request.headers.get("Authorization", "").encode(), f"Bearer {token}".encode()):
+            return jsonify({"message": "Admin token required."}), 401
+        return view(*args, **kwargs)
+    return wrapper
@@ -0,0 +1,287 @@
+"""ASGI entry point: `uvicorn asgi:app --host 0.0.0.0 --port 5000 --workers 2`.
+
+GET /contacts and POST /semantic_search run as async routes. Queries go through psycopg's
+async pool and model encodes run on a small thread pool, so one process can keep
+thousands of connections open while they wait on Postgres or the model. Every other
+route is served by the Flask app in main.py, mounted underneath and run in threads.
+Responses use Flask's JSON encoder, so the contract is identical to the WSGI app's.
+"""
+import asyncio
+import functools
+import math
+import random
+import re
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from a2wsgi import WSGIMiddleware
+from pgvector.psycopg import register_vector_async
+from psycopg.rows import dict_row
+from psycopg_pool import AsyncConnectionPool
+from sqlalchemy.engine import make_url
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import Response
+from starlette.routing import Mount, Route
+from config import cors_origins
+from db_routing import wrote_recently
+from embeddings import active_model_name, coarse_search_dim, generate_embedding
+from instrumentation import count_query, count_results, current_timer, end_request, phase, record, start_request
+from main import app as flask_app
+from search import CONTACT_COLUMNS, EF_SEARCH_SQL, prepare_search
+
+config = flask_app.config
+encode_threads = config["ASGI_ENCODE_THREADS"] or (
+    config["EMBEDDING_BATCH_MAX_SIZE"] if config["EMBEDDING_BATCHING"] else 2
+)
+encode_executor = ThreadPoolExecutor(max_workers=encode_threads, thread_name_prefix="encode")
+
+
+class EncodeQueueFull(Exception):
+    pass
+
+
+def json_response(payload, status_code=200, headers=None):
+    # Flask's provider (and trailing newline), so dates and key order match jsonify
+    body = flask_app.json.dumps(payload, separators=(",", ":")) + "\n"
+    return Response(body, status_code, headers, media_type="application/json")
+
+
+def contact_json(row):
+    return {
+        "id": row["id"],
+        "firstName": row["first_name"],
+        "lastName": row["last_name"],
+        "email": row["email"],
+        "tags": row["tags"],
+        "notes": row["notes"],
+        "search_text": row["search_text"],
+        "embedding_model": row["embedding_model"],
+        "embedded_at": row["embedded_at"],
+    }
+
+
+def psycopg_sql(sql):
+    """Rewrite a SQLAlchemy text() clause's :name parameters as psycopg's %(name)s."""
+    return re.sub(r"(?<![:\w]):(\w+)", r"%(\1)s", str(sql).replace("%", "%%"))
+
+
+async def configure_connection(conn):
+    await register_vector_async(conn)
+    await conn.commit()  # the type lookup opened a transaction
+
+
+def create_pool(url):
+    """An async pool capped and checked like the SQLAlchemy engine's (see config.py).
+
+    Connections open on demand: the mounted Flask app keeps its own engine pool in the
+    same process, so holding pool_size idle connections here too would double the count.
+    """
+    options = config["SQLALCHEMY_ENGINE_OPTIONS"]
+    return AsyncConnectionPool(
+        make_url(url).set(drivername="postgresql").render_as_string(hide_password=False),
+        min_size=0,
+        max_size=options["pool_size"] + max(0, options["max_overflow"]),
+        timeout=options["pool_timeout"],
+        max_lifetime=options["pool_recycle"] if options["pool_recycle"] > 0 else float("inf"),
+        check=AsyncConnectionPool.check_connection if options["pool_pre_ping"] else None,
+        configure=configure_connection,
+        kwargs=dict(options.get("connect_args", {})),
+        open=False,
+    )
+
+
+def read_pool(request):
+    """A replica pool for this request, or the primary if the client wrote recently."""
+    replicas = request.app.state.replica_pools
+    if replicas and not wrote_recently(request.cookies, config["DATABASE_READ_YOUR_WRITES_SECONDS"]):
+        return random.choice(replicas)
+    return request.app.state.primary_pool
+
+
+@asynccontextmanager
+async def transaction(pool):
+    async with pool.connection() as conn:
+        async with conn.transaction():
+            if config["DB_TRANSACTION_POOLER"] and config["DB_STATEMENT_TIMEOUT_MS"]:
+                await conn.execute(f"SET LOCAL statement_timeout = {config['DB_STATEMENT_TIMEOUT_MS']}")
+            yield conn
+
+
+def _encode(query):
+    # The coarse dim is read here too: the cached model state may need the DB session
+    with flask_app.app_context():
+        query_embedding, model_name = generate_embedding(query)
+        return query_embedding, model_name, coarse_search_dim()
+
+
+def _refreshed_model_name():
+    with flask_app.app_context():
+        return active_model_name(refresh=True)
+
+
+async def run_encoder(request, fn, *args):
+    """Run `fn` on the encode threads, refusing work once too many requests are waiting."""
+    state = request.app.state
+    if state.pending_encodes >= config["ASGI_MAX_PENDING_ENCODES"]:
+        raise EncodeQueueFull()
+    state.pending_encodes += 1
+    try:
+        return await asyncio.get_running_loop().run_in_executor(encode_executor, fn, *args)
+    finally:
+        state.pending_encodes -= 1
+
+
+def timed(route):
+    """Time an async route like instrumentation.py times Flask's, Server-Timing header included.
+
+    Requests that raise are recorded here too, but their error responses (built by the
+    exception handlers) go out without the header.
+    """
+    def decorator(endpoint):
+        @functools.wraps(endpoint)
+        async def wrapper(request):
+            token = start_request(route, request.method)
+            try:
+                response = await endpoint(request)
+            except Exception as exc:
+                status = 503 if isinstance(exc, EncodeQueueFull) else 500
+                record(current_timer(), status, request.url.path, {}, config)
+                raise
+            else:
+                record(current_timer(), response.status_code, request.url.path, response.headers, config)
+                return response
+            finally:
+                end_request(token)
+        return wrapper
+    return decorator
+
+
+def int_arg(request, name, default):
+    # Same as Flask's request.args.get(name, default, type=int)
+    try:
+        return int(request.query_params[name])
+    except (KeyError, ValueError):
+        return default
+
+
+async def get_contacts(request):
+    page = int_arg(request, "page", 1)
+    per_page = int_arg(request, "per_page", 10)
+    # Out-of-range values fall back the way Flask-SQLAlchemy's paginate(error_out=False) does
+    page = page if page >= 1 else 1
+    per_page = per_page if per_page >= 1 else 20
+
+    with phase("db"):
+        async with transaction(read_pool(request)) as conn:
+            cur = conn.cursor(row_factory=dict_row)
+            await cur.execute(
+                f"SELECT {CONTACT_COLUMNS} FROM public.contact ORDER BY id LIMIT %s OFFSET %s",
+                (per_page, (page - 1) * per_page),
+            )
+            rows = await cur.fetchall()
+            await cur.execute("SELECT COUNT(*) AS total FROM public.contact")
+            total = (await cur.fetchone())["total"]
+    count_query(len(rows))
+    count_query(1)
+
+    with phase("serialize"):
+        return json_response({
+            "contacts": [contact_json(row) for row in rows],
+            "total": total,
+            "page": page,
+            "per_page": per_page,
+            "pages": math.ceil(total / per_page) if total else 0,
+        })
+
+
+async def search(pool, query_embedding, limit, model_name, coarse_dim):
+    sql, params, ef_search = prepare_search(query_embedding, limit, model_name, coarse_dim=coarse_dim)
+    with phase("db"):
+        async with transaction(pool) as conn:
+            if ef_search is not None:
+                await conn.execute(psycopg_sql(EF_SEARCH_SQL), {"ef_search": str(ef_search)})
+            cur = conn.cursor(row_factory=dict_row)
+            await cur.execute(psycopg_sql(sql), params)
+            rows = await cur.fetchall()
+    count_query(len(rows))
+    return rows
+
+
+async def semantic_search(request):
+    try:
+        data = await request.json()
+    except ValueError:
+        data = None
+    data = data if isinstance(data, dict) else {}
+    query = data.get("query")
+    limit = data.get("limit", 10)
+    try:
+        limit = int(limit)
+    except Exception:
+        limit = 10
+    limit = max(1, min(limit, 50))
+
+    if not query or not str(query).strip():
+        return json_response({"message": "Query is required."}, 400)
+
+    pool = read_pool(request)
+    # Executor threads don't inherit the request's context, so time the encode from here
+    with phase("encode"):
+        query_embedding, model_name, coarse_dim = await run_encoder(request, _encode, query)
+    rows = await search(pool, query_embedding, limit, model_name, coarse_dim)
+    if not rows and await run_encoder(request, _refreshed_model_name) != model_name:
+        # A model cutover landed inside the state TTL; retry with the new model
+        with phase("encode"):
+            query_embedding, model_name, coarse_dim = await run_encoder(request, _encode, query)
+        rows = await search(pool, query_embedding, limit, model_name, coarse_dim)
+    count_results(len(rows))
+
+    with phase("serialize"):
+        results = []
+        for r in rows:
+            result = contact_json(r)
+            result["similarity"] = float(r["similarity"]) if r["similarity"] is not None else None
+            results.append(result)
+        return json_response({"results": results})
+
+
+async def handle_encode_queue_full(request, exc):
+    return json_response({"message": "Too many searches in progress, try again shortly."}, 503,
+                         headers={"Retry-After": "1"})
+
+
+async def handle_unexpected_error(request, exc):
+    flask_app.logger.exception("Unhandled exception: %s", exc)
+    return json_response({"message": str(exc)}, 500)
+
+
+@asynccontextmanager
+async def lifespan(app):
+    app.state.pending_encodes = 0
+    app.state.primary_pool = create_pool(config["SQLALCHEMY_DATABASE_URI"])
+    app.state.replica_pools = [create_pool(config["SQLALCHEMY_BINDS"][key]["url"]) for key in config["DATABASE_REPLICA_BINDS"]]
+    pools = [app.state.primary_pool, *app.state.replica_pools]
+    for pool in pools:
+        await pool.open()
+    try:
+        yield
+    finally:
+        for pool in pools:
+            await pool.close()
+
+
+app = Starlette(
+    routes=[
+        Route("/contacts", timed("/contacts")(get_contacts), methods=["GET"]),
+        Route("/semantic_search", timed("/semantic_search")(semantic_search), methods=["POST"]),
+        Mount("/", app=WSGIMiddleware(flask_app)),
+    ],
+    middleware=[
+        # Also answers preflights for the Flask routes; on other responses it overwrites
+        # (not duplicates) the headers Flask-CORS already set
+        Middleware(CORSMiddleware, allow_origins=cors_origins, allow_methods=["*"], allow_headers=["*"]),
+    ],
+    exception_handlers={EncodeQueueFull: handle_encode_queue_full, Exception: handle_unexpected_error},
+    lifespan=lifespan,
+)
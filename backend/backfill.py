@@ -0,0 +1,203 @@
+"""Backfill worker for contacts whose embedding is missing or stale.
+
+A row needs (re-)embedding when its embedding is NULL (a failed encode, or a row inserted
+straight into `public.contact`), when its columns changed since it was embedded
+(embedded_hash <> profile_hash, both kept by the contact_profile_hash trigger), or when it
+was embedded by a model other than the active one. Batches are claimed with FOR UPDATE
+SKIP LOCKED, so any number of workers can run side by side: each holds its batch's row
+locks while encoding and the others skip past those rows.
+
+Each pass sweeps the stale rows and then the other-model rows in id order, each sweep
+through its own index (models.BACKFILL_INDEXES), so neither claims nor progress reports
+scan the table.
+"""
+import datetime
+import time
+from sqlalchemy import text
+from config import app, db
+from embeddings import active_model_name, build_profile_string, create_embedder, embedder_settings, get_embedder, lock_active_model
+from parallel_embedding import ProcessPoolEmbedder
+from models import PROFILE_HASH_SQL, coarse_embedding
+
+# Missing or out-of-date vectors: exactly the contact_embedding_stale_idx predicate
+STALE_WHERE = "(embedding IS NULL OR embedded_hash IS DISTINCT FROM profile_hash)"
+# Vectors from another model, spelled as ranges so contact_embedding_model_idx can serve it
+OTHER_MODEL_WHERE = "(embedding_model < :active_model OR embedding_model > :active_model OR embedding_model IS NULL)"
+PENDING_WHERE = f"({STALE_WHERE} OR {OTHER_MODEL_WHERE})"
+
+# One sweep per index, the second skipping rows the first one covers
+SWEEPS = [STALE_WHERE, f"{OTHER_MODEL_WHERE} AND NOT {STALE_WHERE}"]
+
+
+def claim_batch_sql(where):
+    return text(f'''
+        SELECT id, first_name, last_name, email, tags, notes
+        FROM public.contact
+        WHERE {where} AND id > :after
+        ORDER BY id
+        LIMIT :batch_size
+        FOR UPDATE SKIP LOCKED
+    ''')
+
+
+CLAIM_BATCH_SQL = [claim_batch_sql(where) for where in SWEEPS]
+
+UPDATE_SQL = text('''
+    UPDATE public.contact SET
+        search_text = :search_text,
+        embedding = :embedding,
+        embedding_coarse = :embedding_coarse,
+        embedding_model = :embedding_model,
+        embedded_at = :embedded_at
+    WHERE id = :id
+''')
+
+
+def pending_ranges(active_model):
+    """(count, first_id, last_id) of the rows each sweep has to embed, counted through its index."""
+    return [db.session.execute(
+        text(f"SELECT COUNT(*) AS count, MIN(id) AS first_id, MAX(id) AS last_id FROM public.contact WHERE {where}"),
+        {"active_model": active_model},
+    ).one() for where in SWEEPS]
+
+
+def estimate_remaining(ranges, sweep, after):
+    """Rows left in this pass, from how far the id cursor is through the current sweep's range.
+
+    Every worker claims in id order and skips the rows others hold, so the cursor follows
+    their combined progress; this assumes pending rows are spread evenly over the ids.
+    """
+    count, first_id, last_id = ranges[sweep]
+    left = 0
+    if count:
+        left = round(count * min(1.0, max(0.0, (last_id - after) / max(last_id - first_id, 1))))
+    return left + sum(r.count for r in ranges[sweep + 1:])
+
+
+def adopt_profile_hashes(step=10000):
+    """Hash rows embedded before the hash columns existed, trusting those whose search_text is still current.
+
+    Run once (`flask adopt-profile-hashes`) after upgrading, before the first backfill.
+    Until then such rows are not pending (neither hash is set); afterwards the ones whose
+    columns changed since they were embedded are. Walks the table in id ranges so no
+    single transaction holds many row locks. Returns how many rows were trusted.
+    """
+    max_id = db.session.execute(text("SELECT COALESCE(MAX(id), 0) FROM public.contact")).scalar()
+    adopted = 0
+    for start in range(0, max_id, step):
+        # The trigger fills profile_hash on the update and leaves embedded_hash as set here
+        adopted += sum(db.session.execute(text(f'''
+            UPDATE public.contact
+            SET embedded_hash = CASE WHEN md5(search_text) = {PROFILE_HASH_SQL} THEN md5(search_text) END
+            WHERE id > :start AND id <= :end AND embedded_hash IS NULL AND embedding IS NOT NULL
+            RETURNING embedded_hash IS NOT NULL
+        '''), {"start": start, "end": start + step}).scalars())
+        db.session.commit()
+    return adopted
+
+
+def embed_batch(rows, embedder):
+    """Encode claimed rows and write their embeddings back (inside the claiming transaction)."""
+    profiles = [build_profile_string(r.first_name, r.last_name, r.email, r.tags, r.notes) for r in rows]
+    vectors = embedder.encode(profiles, batch_size=len(profiles))
+    # Naive UTC, like the binary COPY path in models.copy_contacts
+    embedded_at = datetime.datetime.now(datetime.UTC).replace(tzinfo=None)
+    db.session.execute(UPDATE_SQL, [{
+        "id": r.id,
+        "search_text": profile,
+        "embedding": vector,
+        "embedding_coarse": coarse_embedding(vector),
+        "embedding_model": embedder.model_name,
+        "embedded_at": embedded_at,
+    } for r, profile, vector in zip(rows, profiles, vectors)])
+
+
+def format_eta(seconds):
+    if seconds is None:
+        return "unknown"
+    return str(datetime.timedelta(seconds=int(seconds)))
+
+
+def make_embedder(model_name, backend=None, processes=0):
+    if processes:
+        return ProcessPoolEmbedder(
+            model_name, processes,
+            backend=backend or app.config["EMBEDDER_BACKEND"],
+            settings=embedder_settings(),
+            threads_per_process=app.config["EMBEDDING_PROCESS_THREADS"],
+        )
+    return get_embedder(model_name) if backend is None else create_embedder(backend, model_name)
+
+
+def run(batch_size=64, backend=None, poll_interval=0.0, report_every=10.0, processes=0, report=print):
+    """Embed pending rows until none are left, or forever when `poll_interval` is set.
+
+    With `processes`, each batch is split across that many model processes, so use a
+    batch size of a few hundred per process. Returns (rows embedded, batches that failed).
+    """
+    processed, failed = 0, 0
+    embedder = None
+    while True:
+        active_model = active_model_name(refresh=True)
+        if embedder is None or embedder.model_name != active_model:
+            if isinstance(embedder, ProcessPoolEmbedder):
+                embedder.close()
+            embedder = make_embedder(active_model, backend, processes)
+
+        # Counted once per pass; progress reports estimate from the claim cursor instead
+        ranges = pending_ranges(active_model)
+        db.session.commit()
+        pending_at_start = sum(r.count for r in ranges)
+        if pending_at_start:
+            report(f"{pending_at_start} contacts need embedding with {active_model}")
+        started = last_report = time.monotonic()
+        pass_processed, model_changed = 0, False
+        for sweep, claim_sql in enumerate(CLAIM_BATCH_SQL):
+            after = 0
+            while True:
+                # Locked before the rows, in the same order as cutover, and held until the batch commits
+                if lock_active_model() != active_model:
+                    db.session.rollback()
+                    model_changed = True
+                    break
+                rows = db.session.execute(
+                    claim_sql, {"active_model": active_model, "after": after, "batch_size": batch_size}
+                ).all()
+                if not rows:
+                    db.session.commit()
+                    break
+                after = rows[-1].id
+                try:
+                    embed_batch(rows, embedder)
+                    db.session.commit()
+                except Exception:
+                    # Release the locks and move on; the rows stay pending for the next pass
+                    db.session.rollback()
+                    failed += 1
+                    app.logger.exception("Backfill batch ending at id %s failed", after)
+                    continue
+                pass_processed += len(rows)
+
+                now = time.monotonic()
+                if now - last_report >= report_every:
+                    last_report = now
+                    remaining = estimate_remaining(ranges, sweep, after)
+                    drained = pending_at_start - remaining
+                    eta = remaining * (now - started) / drained if drained > 0 else None
+                    report(f"{pass_processed} embedded by this worker ({pass_processed / (now - started):.1f} rows/s), "
+                           f"~{remaining} remaining, ETA {format_eta(eta)}")
+            if model_changed:
+                break
+
+        processed += pass_processed
+        if pass_processed:
+            elapsed = time.monotonic() - started
+            report(f"Pass done: {pass_processed} rows in {elapsed:.1f}s ({pass_processed / elapsed:.1f} rows/s)")
+        if model_changed:
+            report("The active model changed; starting over with the new one")
+            continue
+        if not poll_interval:
+            if isinstance(embedder, ProcessPoolEmbedder):
+                embedder.close()
+            return processed, failed
+        time.sleep(poll_interval)
@@ -0,0 +1,92 @@
+"""Dynamic micro-batching for embedding calls.
+
+Concurrent callers submit single strings; one inference thread drains the queue into
+batches of up to `max_batch_size` (waiting at most `max_wait_ms` for stragglers once
+the first item arrives), runs one batched forward pass and resolves each caller's future.
+"""
+import queue
+import threading
+import time
+from concurrent.futures import Future
+import numpy as np
+import metrics
+
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+WAIT_SECONDS_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25)
+
+
+class MicroBatcher:
+    def __init__(self, encode_batch, max_batch_size=32, max_wait_ms=5, name="embedding-batcher"):
+        self.encode_batch = encode_batch  # list[str] -> float32 array (n, dim)
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.name = name
+        self._queue = queue.Queue()
+        self.batch_sizes = metrics.histogram(
+            "embedding_batch_size", "Texts per batched forward pass.", BATCH_SIZE_BUCKETS
+        )
+        self.queue_wait = metrics.histogram(
+            "embedding_batch_queue_wait_seconds", "Time a text waits before its batch starts.", WAIT_SECONDS_BUCKETS
+        )
+        self.encode_seconds = metrics.histogram(
+            "embedding_batch_encode_seconds", "Duration of each batched forward pass.", WAIT_SECONDS_BUCKETS + (0.5, 1, 2.5)
+        )
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def submit(self, text):
+        future = Future()
+        self._queue.put((text, future, time.monotonic()))
+        return future
+
+    def encode(self, texts):
+        """Encode `texts`, batched together with whatever other threads are encoding."""
+        futures = [self.submit(t) for t in texts]
+        return np.stack([f.result() for f in futures]) if futures else np.empty((0, 0), dtype=np.float32)
+
+    def stats(self):
+        """Batch size, queue wait and encode time distributions for this batcher."""
+        def series(histogram):
+            return [s for s in histogram.to_json() if s["labels"].get("batcher") == self.name]
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000,
+            "queued": self._queue.qsize(),
+            "batch_size": series(self.batch_sizes),
+            "queue_wait_seconds": series(self.queue_wait),
+            "encode_seconds": series(self.encode_seconds),
+        }
+
+    def _collect(self):
+        # Block for the first item, then gather more until the batch is full or the window closes
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            started = time.monotonic()
+            self.batch_sizes.observe(len(batch), batcher=self.name)
+            for _, _, submitted in batch:
+                self.queue_wait.observe(started - submitted, batcher=self.name)
+
+            texts = [text for text, _, _ in batch]
+            try:
+                embeddings = self.encode_batch(texts)
+            except Exception as e:
+                for _, future, _ in batch:
+                    future.set_exception(e)
+                continue
+            finally:
+                self.encode_seconds.observe(time.monotonic() - started, batcher=self.name)
+            for (_, future, _), embedding in zip(batch, embeddings):
+                future.set_result(embedding)
@@ -0,0 +1,175 @@
+"""Recall@k against latency for HNSW and IVFFlat index parameters.
+
+The active model's embeddings are copied into a scratch table (ann_eval), so indexes can
+be built and dropped there without touching public.contact. Ground truth is exact top-k
+computed with NumPy over every embedding. Each index configuration (HNSW m and
+ef_construction, IVFFlat lists) is then built in turn. Its queries are swept over the
+search-time knob (hnsw.ef_search, ivfflat.probes), which gives one recall-vs-latency
+curve per index:
+
+    python -m benchmarks.ann_recall --queries 200 --k 10 \\
+        --hnsw-m 8,16,32 --ef-construction 64,128 --ef-search 10,20,40,80,160 \\
+        --ivfflat-lists 100,1000 --probes 1,5,10,20 --save curves.json
+
+Queries are stored embeddings plus a little noise, as in quantized_search.py.
+"""
+import argparse
+import json
+import sys
+import time
+import numpy as np
+from sqlalchemy import text
+from config import app, db
+from embeddings import active_model_name
+from model_registry import embedding_dimension
+from benchmarks.quantized_search import sample_queries
+
+TABLE = "ann_eval"
+
+
+def int_list(value):
+    return [int(v) for v in value.split(",") if v.strip()]
+
+
+def create_eval_table(model_name, dimension):
+    db.session.execute(text(f"DROP TABLE IF EXISTS {TABLE}"))
+    db.session.execute(text(f"CREATE UNLOGGED TABLE {TABLE} (id integer PRIMARY KEY, embedding vector({dimension}))"))
+    count = db.session.execute(text(f'''
+        INSERT INTO {TABLE} (id, embedding)
+        SELECT id, embedding::vector({dimension}) FROM public.contact
+        WHERE embedding IS NOT NULL AND embedding_model = :model
+    '''), {"model": model_name}).rowcount
+    db.session.execute(text(f"ANALYZE {TABLE}"))
+    db.session.commit()
+    return count
+
+
+def load_embeddings(batch=10_000):
+    """(ids, unit-length float32 matrix) of every row in the scratch table."""
+    ids, chunks = [], []
+    dbapi_connection = db.session.connection().connection.driver_connection
+    with dbapi_connection.cursor(name="ann_eval_load") as cur:  # server-side: streams in batches
+        cur.itersize = batch
+        cur.execute(f"SELECT id, embedding FROM {TABLE} ORDER BY id", binary=True)
+        while rows := cur.fetchmany(batch):
+            ids.extend(r[0] for r in rows)
+            chunks.append(np.stack([r[1].to_numpy() for r in rows]).astype(np.float32, copy=False))
+    db.session.commit()
+    matrix = np.concatenate(chunks)
+    matrix /= np.clip(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12, None)
+    return np.array(ids), matrix
+
+
+def exact_top_k(queries, ids, matrix, k, chunk=256):
+    """Brute-force cosine top-k ids for each query, best first."""
+    results = []
+    for start in range(0, len(queries), chunk):
+        scores = np.stack(queries[start:start + chunk]) @ matrix.T
+        top = np.argpartition(-scores, min(k, scores.shape[1] - 1), axis=1)[:, :k]
+        for row, candidates in zip(scores, top):
+            results.append(ids[candidates[np.argsort(-row[candidates])]].tolist())
+    return results
+
+
+def build_index(method, params):
+    """Replace the scratch table's index; returns (build seconds, index size in bytes)."""
+    db.session.execute(text(f"DROP INDEX IF EXISTS {TABLE}_embedding_idx"))
+    options = ", ".join(f"{name} = {int(value)}" for name, value in params.items())
+    start = time.perf_counter()
+    db.session.execute(text(
+        f"CREATE INDEX {TABLE}_embedding_idx ON {TABLE} USING {method} (embedding vector_cosine_ops) WITH ({options})"
+    ))
+    db.session.commit()
+    elapsed = time.perf_counter() - start
+    size = db.session.execute(text(f"SELECT pg_relation_size('{TABLE}_embedding_idx')")).scalar()
+    db.session.commit()
+    return elapsed, size
+
+
+def run_queries(queries, k, setting, value):
+    """ANN top-k ids for each query with `setting` = `value`, and latencies in ms."""
+    results, latencies = [], []
+    for q in queries:
+        start = time.perf_counter()
+        # Transaction-local settings; seqscan off so the index under test is always used
+        db.session.execute(text("SELECT set_config(:setting, :value, true), set_config('enable_seqscan', 'off', true)"),
+                           {"setting": setting, "value": str(value)})
+        ids = db.session.execute(
+            text(f"SELECT id FROM {TABLE} ORDER BY embedding <=> :q LIMIT :k"), {"q": q, "k": k}
+        ).scalars().all()
+        db.session.rollback()
+        latencies.append(time.perf_counter() - start)
+        results.append(ids)
+    return results, np.array(latencies) * 1000
+
+
+def recall(results, truth):
+    return float(np.mean([len(set(r) & set(t)) / max(len(t), 1) for r, t in zip(results, truth)]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--noise", type=float, default=0.05, help="stddev of noise added to each query vector")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--hnsw-m", type=int_list, default=[16])
+    parser.add_argument("--ef-construction", type=int_list, default=[64])
+    parser.add_argument("--ef-search", type=int_list, default=[10, 20, 40, 80, 160])
+    parser.add_argument("--ivfflat-lists", type=int_list, default=[], help="e.g. 100,1000 (none by default)")
+    parser.add_argument("--probes", type=int_list, default=[1, 5, 10, 20])
+    parser.add_argument("--save", help="write the curves to this JSON file")
+    args = parser.parse_args()
+
+    with app.app_context():
+        model_name = active_model_name()
+        queries = sample_queries(args.queries, args.noise, args.seed)
+        if not queries:
+            raise SystemExit("No embedded contacts to evaluate against.")
+        count = create_eval_table(model_name, embedding_dimension(model_name))
+        try:
+            start = time.perf_counter()
+            ids, matrix = load_embeddings()
+            truth = exact_top_k(queries, ids, matrix, args.k)
+            exact_ms = (time.perf_counter() - start) * 1000 / len(queries)
+            print(f"{count} {model_name} embeddings, {len(queries)} queries, k={args.k}; "
+                  f"exact top-k in NumPy (including the load): {exact_ms:.2f} ms/query")
+
+            configs = [("hnsw", {"m": m, "ef_construction": ef}, "hnsw.ef_search", args.ef_search)
+                       for m in args.hnsw_m for ef in args.ef_construction]
+            configs += [("ivfflat", {"lists": lists}, "ivfflat.probes", args.probes) for lists in args.ivfflat_lists]
+
+            curves = []
+            print(f"{'index':<32} {'build s':>8} {'size MB':>8} {'knob':>16} {'recall@k':>9} {'p50 ms':>8} {'p95 ms':>8}")
+            for method, params, setting, values in configs:
+                label = f"{method}({', '.join(f'{n}={v}' for n, v in params.items())})"
+                print(f"Building {label}...", end="\r", file=sys.stderr)
+                build_seconds, size = build_index(method, params)
+                points = []
+                for value in values:
+                    results, latencies = run_queries(queries, args.k, setting, value)
+                    point = {
+                        setting: value,
+                        "recall": round(recall(results, truth), 4),
+                        "p50_ms": round(float(np.percentile(latencies, 50)), 3),
+                        "p95_ms": round(float(np.percentile(latencies, 95)), 3),
+                    }
+                    points.append(point)
+                    knob = f"{setting.split('.')[1]}={value}"
+                    print(f"{label:<32} {build_seconds:>8.2f} {size / 2**20:>8.1f} {knob:>16} "
+                          f"{point['recall']:>9.3f} {point['p50_ms']:>8.2f} {point['p95_ms']:>8.2f}")
+                curves.append({"method": method, "params": params, "build_seconds": round(build_seconds, 2),
+                               "size_bytes": size, "points": points})
+        finally:
+            db.session.rollback()
+            db.session.execute(text(f"DROP TABLE IF EXISTS {TABLE}"))
+            db.session.commit()
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump({"rows": count, "model": model_name, "queries": len(queries), "k": args.k,
+                       "exact_ms_per_query": round(exact_ms, 3), "curves": curves}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+"""Embedding layer microbenchmark: latency, throughput, conversion cost and memory per backend.
+
+Each backend runs in a fresh process, so its load time and memory footprint are its own.
+For each one it reports:
+
+- load time and resident memory added by the model
+- generate_embedding() latency for one string (the request path), next to the model's
+  own encode; the gap is the glue code (normalization happens inside the model call)
+- what .tolist() on a vector would cost (the price of the old list-based paths)
+- encode throughput at each batch size, and peak memory
+
+No database is needed. Backends that can't load (no ONNX export, say) are skipped:
+
+    python -m benchmarks.embedding --backends torch,onnx,onnx-int8 --batch-sizes 1,8,32,128
+
+Compare the numbers to decide where to scale. If single-string encode dominates, look at
+the model and threads. If batched throughput is far above single-string, turn on
+micro-batching. If generate_embedding is well above the model encode, fix the glue code.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import time
+
+BACKENDS = {
+    "torch": {"EMBEDDER_BACKEND": "torch"},
+    "onnx": {"EMBEDDER_BACKEND": "onnx", "EMBEDDER_ONNX_QUANTIZED": "false"},
+    "onnx-int8": {"EMBEDDER_BACKEND": "onnx", "EMBEDDER_ONNX_QUANTIZED": "true"},
+    "random": {"EMBEDDER_BACKEND": "random"},
+}
+
+SAMPLE_NOTES = [
+    "Gym buddy. Likes weekend classes and coffee after.",
+    "Building manager. Text for urgent repairs (leaks, heating). Email for paperwork.",
+    "Primary care clinic. Front desk asks for DOB when scheduling. Best to call mornings.",
+    "Works on the marketing team. Preferred contact: email. Usually free after 3pm. " * 3,
+]
+
+
+def rss_bytes():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        return peak_rss_bytes()
+
+
+def peak_rss_bytes():
+    # ru_maxrss is KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def percentiles(seconds):
+    import numpy as np
+
+    us = np.array(seconds) * 1e6
+    return {"p50_us": round(float(np.percentile(us, 50)), 1), "p95_us": round(float(np.percentile(us, 95)), 1)}
+
+
+def measure(backend, model_name, repeats, batch_sizes, batch_texts):
+    """Run in a fresh process: configure `backend`, load it, and time the embedding layer."""
+    os.environ.update(BACKENDS[backend])
+    import numpy as np
+    from config import app
+    from embeddings import build_profile_string, generate_embedding, get_embedder
+
+    texts = [build_profile_string(f"First{i}", f"Last{i}", f"user{i}@example.com", ["friend", "gym"][: i % 3],
+                                  SAMPLE_NOTES[i % len(SAMPLE_NOTES)]) for i in range(max(batch_texts, repeats))]
+    model_name = model_name or app.config["EMBEDDING_MODEL"]
+    result = {"backend": backend}
+    with app.app_context():
+        before = rss_bytes()
+        start = time.perf_counter()
+        try:
+            embedder = get_embedder(model_name)
+        except Exception as e:
+            return {"backend": backend, "skipped": f"{type(e).__name__}: {e}"}
+        result["model"] = embedder.model_name
+        result["load_seconds"] = round(time.perf_counter() - start, 2)
+        result["model_rss_mb"] = round((rss_bytes() - before) / 2**20, 1)
+        for text in texts[:5]:  # warm up (first calls allocate and JIT)
+            generate_embedding(text, model_name)
+
+        request, encode, tolist = [], [], []
+        for text in texts[:repeats]:
+            t0 = time.perf_counter()
+            vector, _ = generate_embedding(text, model_name)
+            request.append(time.perf_counter() - t0)
+
+            t0 = time.perf_counter()
+            raw = embedder.encode([text])[0]
+            encode.append(time.perf_counter() - t0)
+            assert raw.dtype == np.float32 and abs(float(raw @ raw) - 1) < 1e-3, "encode must return unit float32"
+
+            t0 = time.perf_counter()
+            vector.tolist()
+            tolist.append(time.perf_counter() - t0)
+        result["generate_embedding"] = percentiles(request)
+        result["encode_one"] = percentiles(encode)
+        result["tolist"] = percentiles(tolist)
+
+        result["batches"] = {}
+        for batch_size in batch_sizes:
+            batch = texts[:max(batch_texts, batch_size)]
+            t0 = time.perf_counter()
+            vectors = embedder.encode(batch, batch_size=batch_size)
+            elapsed = time.perf_counter() - t0
+            result["batches"][batch_size] = {
+                "texts_per_s": round(len(batch) / elapsed, 1),
+                "us_per_text": round(elapsed * 1e6 / len(batch), 1),
+            }
+            del vectors
+        result["peak_rss_mb"] = round(peak_rss_bytes() / 2**20, 1)
+        result["dimension"] = embedder.dimension
+    return result
+
+
+def run_isolated(backend, args):
+    # spawn: a fresh interpreter, so nothing loaded by another backend is counted
+    with multiprocessing.get_context("spawn").Pool(1) as pool:
+        return pool.apply(measure, (backend, args.model, args.repeats, args.batch_sizes, args.batch_texts))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--backends", default="torch,onnx,onnx-int8",
+                        help=f"comma-separated, from {', '.join(BACKENDS)}")
+    parser.add_argument("--model", help="model name (default: EMBEDDING_MODEL)")
+    parser.add_argument("--repeats", type=int, default=200, help="single-string calls to time")
+    parser.add_argument("--batch-sizes", type=lambda v: [int(b) for b in v.split(",")], default=[1, 8, 32, 128])
+    parser.add_argument("--batch-texts", type=int, default=512, help="texts encoded per batch-size run")
+    parser.add_argument("--save", help="write the results to this JSON file")
+    args = parser.parse_args()
+
+    results = []
+    for backend in args.backends.split(","):
+        if backend not in BACKENDS:
+            raise SystemExit(f"Unknown backend {backend!r}; choose from {', '.join(BACKENDS)}")
+        result = run_isolated(backend, args)
+        results.append(result)
+        if "skipped" in result:
+            print(f"{backend}: skipped ({result['skipped']})\n")
+            continue
+
+        print(f"{backend} ({result['model']}): loaded in {result['load_seconds']}s, "
+              f"+{result['model_rss_mb']} MB resident, peak {result['peak_rss_mb']} MB")
+        print(f"  {'single string':<22} {'p50 us':>9} {'p95 us':>9}")
+        for key, label in (("generate_embedding", "generate_embedding()"), ("encode_one", "  model encode"),
+                           ("tolist", ".tolist() (avoided)")):
+            print(f"  {label:<22} {result[key]['p50_us']:>9.1f} {result[key]['p95_us']:>9.1f}")
+        print(f"  {'batch size':<22} {'texts/s':>9} {'us/text':>9}")
+        for batch_size, row in result["batches"].items():
+            print(f"  {batch_size:<22} {row['texts_per_s']:>9.1f} {row['us_per_text']:>9.1f}")
+        print()
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
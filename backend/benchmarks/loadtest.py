@@ -0,0 +1,271 @@
+"""Mixed read/write load against a running backend, driven by a JSON scenario file.
+
+Each virtual user is a thread with its own keep-alive connection. It picks a request
+from the scenario by weight, sends it, waits a random think time, and repeats until the
+test ends. Users start evenly over the ramp-up. Per-endpoint throughput, latency
+percentiles and error rates are printed at the end, with a progress line on the way:
+
+    python -m benchmarks.loadtest benchmarks/scenarios/mixed.json --url http://localhost:5000 \\
+        --users 50 --duration 120 --save run.json
+
+The scenario's writes really happen, so point it at a staging database. See
+benchmarks/scenarios/mixed.json for the format. Strings in a request's path and body may
+hold placeholders:
+
+    {seq}              a number unique to this run
+    {uuid}             a random hex string
+    {int:1:500}        a random integer in [1, 500]
+    {choice:a|b|c}     one of the listed values
+    {query}            one of the scenario's "queries"
+    {contact_id}       the id of an existing contact (sampled from /contacts at start-up)
+
+A request with "csv_rows" posts a generated CSV of that many new contacts to its path as
+a multipart upload (for /import_contacts).
+"""
+import argparse
+import itertools
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from collections import defaultdict
+from http.client import HTTPConnection, HTTPSConnection
+from urllib.parse import urlsplit
+import numpy as np
+
+PLACEHOLDER = re.compile(r"\{(\w+)(?::([^{}]*))?\}")
+
+_seq = itertools.count(1)
+
+
+class Client:
+    """One keep-alive HTTP connection, reopened after errors (like embedders.RemoteEmbedder's)."""
+
+    def __init__(self, url, timeout):
+        parts = urlsplit(url)
+        self.cls = HTTPSConnection if parts.scheme == "https" else HTTPConnection
+        self.host, self.port, self.timeout = parts.hostname, parts.port, timeout
+        self.prefix = parts.path.rstrip("/")
+        self.conn = None
+
+    def request(self, method, path, body=None, headers=None):
+        """Returns (status, body bytes); raises on connection errors."""
+        if self.conn is None:
+            self.conn = self.cls(self.host, self.port, timeout=self.timeout)
+        try:
+            self.conn.request(method, self.prefix + path, body=body, headers=headers or {})
+            response = self.conn.getresponse()
+            return response.status, response.read()
+        except Exception:
+            self.conn.close()
+            self.conn = None
+            raise
+
+
+class Scenario:
+    def __init__(self, spec, contact_ids):
+        self.spec = spec
+        self.requests = spec["requests"]
+        self.weights = [r.get("weight", 1) for r in self.requests]
+        self.queries = spec.get("queries") or ["coffee"]
+        self.contact_ids = contact_ids
+
+    def expand(self, name, arg):
+        if name == "seq":
+            return next(_seq)
+        if name == "uuid":
+            return uuid.uuid4().hex[:12]
+        if name == "int":
+            low, high = (int(v) for v in arg.split(":"))
+            return random.randint(low, high)
+        if name == "choice":
+            return random.choice(arg.split("|"))
+        if name == "query":
+            return random.choice(self.queries)
+        if name == "contact_id":
+            if not self.contact_ids:
+                raise RuntimeError("{contact_id} used but the backend has no contacts")
+            return random.choice(self.contact_ids)
+        raise ValueError(f"Unknown placeholder {{{name}}}")
+
+    def render(self, value):
+        if isinstance(value, str):
+            whole = PLACEHOLDER.fullmatch(value)
+            if whole:  # keep numbers numeric, e.g. "limit": "{int:5:20}"
+                return self.expand(*whole.groups())
+            return PLACEHOLDER.sub(lambda m: str(self.expand(*m.groups())), value)
+        if isinstance(value, list):
+            return [self.render(v) for v in value]
+        if isinstance(value, dict):
+            return {k: self.render(v) for k, v in value.items()}
+        return value
+
+    def next_request(self):
+        """(name, method, path, body, headers) for a randomly chosen request."""
+        req = random.choices(self.requests, weights=self.weights)[0]
+        path = self.render(req["path"])
+        body, headers = None, {}
+        if "csv_rows" in req:
+            body, content_type = multipart_csv(req["csv_rows"])
+            headers["Content-Type"] = content_type
+        elif "json" in req:
+            body = json.dumps(self.render(req["json"])).encode()
+            headers["Content-Type"] = "application/json"
+        return req["name"], req.get("method", "GET"), path, body, headers
+
+
+def multipart_csv(rows):
+    run = uuid.uuid4().hex[:8]
+    lines = ["first_name,last_name,email,tags,notes"]
+    for i in range(rows):
+        lines.append(f"Load,Test{i},load.{run}.{next(_seq)}@example.com,loadtest;import,Imported by the load test")
+    boundary = uuid.uuid4().hex
+    body = (
+        f"--{boundary}\r\n"
+        'Content-Disposition: form-data; name="file"; filename="contacts.csv"\r\n'
+        "Content-Type: text/csv\r\n\r\n"
+        + "\n".join(lines) + "\n"
+        + f"\r\n--{boundary}--\r\n"
+    ).encode()
+    return body, f"multipart/form-data; boundary={boundary}"
+
+
+class Stats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.statuses = defaultdict(lambda: defaultdict(int))
+
+    def record(self, name, seconds, status):
+        with self.lock:
+            self.latencies[name].append(seconds)
+            self.statuses[name][status] += 1
+            if not isinstance(status, int) or status >= 400:
+                self.errors[name] += 1
+
+    def total(self):
+        with self.lock:
+            return sum(len(v) for v in self.latencies.values()), sum(self.errors.values())
+
+    def summary(self, elapsed):
+        with self.lock:
+            names = sorted(self.latencies)
+            rows = {name: self._summarize(self.latencies[name], self.errors[name], self.statuses[name], elapsed)
+                    for name in names}
+            rows["all"] = self._summarize(
+                [s for v in self.latencies.values() for s in v], sum(self.errors.values()), {}, elapsed)
+        return rows
+
+    @staticmethod
+    def _summarize(latencies, errors, statuses, elapsed):
+        ms = np.array(latencies) * 1000 if latencies else np.zeros(1)
+        return {
+            "requests": len(latencies),
+            "errors": errors,
+            "error_rate": round(errors / len(latencies), 4) if latencies else 0.0,
+            "throughput_per_s": round(len(latencies) / elapsed, 2),
+            "p50_ms": round(float(np.percentile(ms, 50)), 2),
+            "p95_ms": round(float(np.percentile(ms, 95)), 2),
+            "p99_ms": round(float(np.percentile(ms, 99)), 2),
+            "max_ms": round(float(ms.max()), 2),
+            "statuses": {str(k): v for k, v in statuses.items()},
+        }
+
+
+def fetch_contact_ids(url, timeout, limit=1000):
+    client = Client(url, timeout)
+    ids, page = [], 1
+    while len(ids) < limit:
+        status, body = client.request("GET", f"/contacts?page={page}&per_page=100")
+        if status != 200:
+            raise SystemExit(f"GET /contacts returned {status}; is the backend up at {url}?")
+        contacts = json.loads(body)["contacts"]
+        ids.extend(c["id"] for c in contacts)
+        if len(contacts) < 100:
+            break
+        page += 1
+    return ids
+
+
+def user(scenario, client, stats, start_at, deadline, think_time):
+    time.sleep(max(0.0, start_at - time.monotonic()))
+    while time.monotonic() < deadline:
+        name, method, path, body, headers = scenario.next_request()
+        t0 = time.perf_counter()
+        try:
+            status, _ = client.request(method, path, body, headers)
+        except Exception as exc:
+            status = type(exc).__name__
+        stats.record(name, time.perf_counter() - t0, status)
+        if think_time[1] > 0:
+            time.sleep(random.uniform(*think_time) / 1000)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("scenario", help="scenario JSON file")
+    parser.add_argument("--url", default="http://localhost:5000")
+    parser.add_argument("--users", type=int, help="concurrent virtual users (overrides the scenario)")
+    parser.add_argument("--duration", type=float, help="seconds of load after ramp-up (overrides the scenario)")
+    parser.add_argument("--ramp-up", type=float, help="seconds over which users start (overrides the scenario)")
+    parser.add_argument("--timeout", type=float, default=30)
+    parser.add_argument("--report-every", type=float, default=5)
+    parser.add_argument("--save", help="write the summary to this JSON file")
+    args = parser.parse_args()
+
+    with open(args.scenario) as f:
+        spec = json.load(f)
+    users = args.users or spec.get("users", 10)
+    duration = args.duration or spec.get("duration_seconds", 60)
+    ramp_up = spec.get("ramp_up_seconds", 0) if args.ramp_up is None else args.ramp_up
+    think_time = spec.get("think_time_ms", [0, 0])
+
+    uses_ids = "{contact_id}" in json.dumps(spec["requests"])
+    scenario = Scenario(spec, fetch_contact_ids(args.url, args.timeout) if uses_ids else [])
+    stats = Stats()
+    start = time.monotonic()
+    deadline = start + ramp_up + duration
+    threads = [
+        threading.Thread(
+            target=user, daemon=True,
+            args=(scenario, Client(args.url, args.timeout), stats, start + ramp_up * i / users, deadline, think_time),
+        )
+        for i in range(users)
+    ]
+    print(f"{spec.get('name', args.scenario)}: {users} users, {ramp_up:g}s ramp-up, {duration:g}s at full load "
+          f"against {args.url}")
+    for t in threads:
+        t.start()
+
+    last_count, last_time = 0, start
+    while time.monotonic() < deadline:
+        time.sleep(max(0.0, min(args.report_every, deadline - time.monotonic())))
+        now = time.monotonic()
+        count, errors = stats.total()
+        print(f"[{now - start:6.1f}s] {count} requests, {errors} errors, "
+              f"{(count - last_count) / max(now - last_time, 1e-9):.1f} req/s")
+        last_count, last_time = count, now
+    for t in threads:
+        t.join()  # each user finishes its request in flight
+
+    summary = stats.summary(elapsed=time.monotonic() - start)
+    print(f"\n{'endpoint':<16} {'reqs':>7} {'err %':>6} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+    for name, row in summary.items():
+        print(f"{name:<16} {row['requests']:>7} {row['error_rate'] * 100:>6.2f} {row['throughput_per_s']:>8.1f} "
+              f"{row['p50_ms']:>8.1f} {row['p95_ms']:>8.1f} {row['p99_ms']:>8.1f} {row['max_ms']:>8.1f}")
+    for name, row in summary.items():
+        failures = {status: n for status, n in row["statuses"].items() if not status.isdigit() or int(status) >= 400}
+        if failures:
+            print(f"  {name} errors: {failures}")
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump({"scenario": spec.get("name", args.scenario), "url": args.url, "users": users,
+                       "duration_seconds": duration, "ramp_up_seconds": ramp_up, "endpoints": summary}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
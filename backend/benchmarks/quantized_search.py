@@ -0,0 +1,83 @@
+"""Recall and latency of each vector index mode against exact float32 search.
+
+Set COARSE_EMBEDDING_DIM (and run `flask backfill-coarse`) to measure the modes over the
+truncated coarse column instead; until the backfill finishes, searches use the full vectors.
+
+Queries are stored embeddings plus a little noise, so no model download is needed:
+
+    python -m benchmarks.quantized_search --queries 200 --k 10
+
+Build the indexes first (`flask --app main vector-index create --mode halfvec`, etc.);
+without them the quantized modes still return correct recall but scan the whole table.
+"""
+import argparse
+import time
+import numpy as np
+from sqlalchemy import text
+from sqlalchemy.exc import ProgrammingError
+from config import app, db
+from embeddings import active_model_name, coarse_search_dim
+from search import INDEX_MODES, index_name, search_contacts
+
+
+def sample_queries(n, noise, seed):
+    rows = db.session.execute(text(
+        "SELECT embedding FROM public.contact WHERE embedding IS NOT NULL ORDER BY random() LIMIT :n"
+    ), {"n": n}).scalars().all()
+    rng = np.random.default_rng(seed)
+    queries = []
+    for embedding in rows:
+        q = embedding.to_numpy() + rng.normal(0, noise, embedding.dimensions()).astype(np.float32)
+        queries.append(q / np.linalg.norm(q))
+    return queries
+
+
+def run_mode(mode, queries, k, coarse_dim=None):
+    latencies = []
+    results = []
+    for q in queries:
+        start = time.perf_counter()
+        rows = search_contacts(q, k, active_model_name(), mode=mode, coarse_dim=coarse_dim)
+        latencies.append(time.perf_counter() - start)
+        results.append([r["id"] for r in rows])
+        db.session.rollback()  # end the transaction so SET LOCAL settings reset per query
+    return results, np.array(latencies) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--noise", type=float, default=0.05, help="stddev of noise added to each query vector")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    with app.app_context():
+        queries = sample_queries(args.queries, args.noise, args.seed)
+        if not queries:
+            raise SystemExit("No embedded contacts to benchmark against.")
+        existing = set(db.session.execute(text(
+            "SELECT indexname FROM pg_indexes WHERE tablename = 'contact'"
+        )).scalars())
+
+        # The dimension the searches actually use, so the index column matches the query
+        coarse_dim = coarse_search_dim()
+        exact, _ = run_mode("exact", queries, args.k, coarse_dim=0)
+        print(f"{len(queries)} queries, k={args.k}, ANN_CANDIDATES={app.config['ANN_CANDIDATES']}, "
+              f"COARSE_EMBEDDING_DIM={app.config['COARSE_EMBEDDING_DIM']} (in use: {coarse_dim or 'no'})")
+        print(f"{'mode':<8} {'index':<6} {'recall@k':>9} {'p50 ms':>8} {'p95 ms':>8}")
+        for mode in INDEX_MODES:
+            try:
+                results, latencies = run_mode(mode, queries, args.k, coarse_dim)
+            except ProgrammingError as e:
+                db.session.rollback()
+                # halfvec and binary_quantize need pgvector >= 0.7
+                print(f"{mode:<8} skipped: {str(e.orig).splitlines()[0]}")
+                continue
+            recall = np.mean([len(set(r) & set(e)) / max(len(e), 1) for r, e in zip(results, exact)])
+            has_index = "-" if mode == "exact" else ("yes" if index_name(mode, coarse_dim) in existing else "no")
+            print(f"{mode:<8} {has_index:<6} {recall:>9.3f} {np.percentile(latencies, 50):>8.2f} {np.percentile(latencies, 95):>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
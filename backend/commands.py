@@ -0,0 +1,397 @@
+"""Flask CLI commands for database maintenance. Run with `flask --app main <command>`."""
+import concurrent.futures
+import threading
+import click
+from flask.cli import AppGroup
+from sqlalchemy import text
+from config import app, db
+from models import coarse_embedding
+from embedders import MODEL_NAME, OnnxEmbedder, SentenceTransformerEmbedder, export_onnx
+from embeddings import active_model_name, coarse_search_dim, create_embedder, lock_active_model
+from contact_import import MissingColumns, read_contacts_csv, write_contacts
+from parallel_embedding import ProcessPoolEmbedder
+from cpu_tuning import autotune_torch_threads, cpu_slice, pin_to_cpus
+from search import INDEX_MODES, ann_expressions, coarse_filter, index_name, set_ef_search
+from model_registry import EMBEDDING_MODELS, embedding_dimension
+import backfill
+import model_migration
+
+ANN_MODES = [mode for mode in INDEX_MODES if mode != "exact"]
+
+vector_index_cli = AppGroup("vector-index", help="Manage the HNSW indexes used by semantic search.")
+embedder_cli = AppGroup("embedder", help="Export and check embedding model backends.")
+model_cli = AppGroup("embedding-model", help="Switch embedding models without downtime.")
+
+
+def autocommit_connection():
+    # CREATE/DROP INDEX CONCURRENTLY cannot run inside a transaction block
+    return db.engine.connect().execution_options(isolation_level="AUTOCOMMIT")
+
+
+def default_index_mode():
+    mode = app.config["VECTOR_INDEX_MODE"]
+    return mode if mode in ANN_MODES else "vector"
+
+
+coarse_option = click.option(
+    "--coarse", is_flag=True,
+    help="Index the truncated embedding_coarse column (COARSE_EMBEDDING_DIM) instead of the full embedding.",
+)
+
+
+@vector_index_cli.command("create")
+@click.option("--mode", type=click.Choice(ANN_MODES), default=default_index_mode)
+@coarse_option
+@click.option("--m", default=16, show_default=True, help="HNSW graph degree.")
+@click.option("--ef-construction", default=64, show_default=True, help="HNSW build-time candidate list size.")
+def create_vector_index(mode, coarse, m, ef_construction):
+    """Build the HNSW index for MODE without blocking writes.
+
+    Existing rows are indexed as part of the build, so switching VECTOR_INDEX_MODE is:
+    create the index, then restart the backend with the new mode.
+    """
+    coarse_dim = app.config["COARSE_EMBEDDING_DIM"] if coarse else 0
+    if coarse and not coarse_dim:
+        raise click.UsageError("Set COARSE_EMBEDDING_DIM to index the coarse column.")
+    _, definition = ann_expressions(mode, embedding_dimension(active_model_name()), coarse_dim)
+    name = index_name(mode, coarse_dim)
+    # Partial, so rows with another prefix length can't fail the cast in the index expression
+    where = f" WHERE {coarse_filter(coarse_dim)}" if coarse_dim else ""
+    click.echo(f"Building {name} (m={m}, ef_construction={ef_construction})...")
+    with autocommit_connection() as conn:
+        conn.execute(text(
+            f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON public.contact "
+            f"USING hnsw ({definition}) WITH (m = {int(m)}, ef_construction = {int(ef_construction)}){where}"
+        ))
+    click.echo("Done.")
+
+
+@vector_index_cli.command("drop")
+@click.option("--mode", type=click.Choice(ANN_MODES), required=True)
+@coarse_option
+def drop_vector_index(mode, coarse):
+    """Drop the HNSW index for MODE."""
+    name = index_name(mode, app.config["COARSE_EMBEDDING_DIM"] if coarse else 0)
+    with autocommit_connection() as conn:
+        conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS public.{name}"))
+    click.echo(f"Dropped {name}.")
+
+
+@vector_index_cli.command("status")
+def vector_index_status():
+    """Show which vector indexes exist and how large they are next to the table."""
+    rows = db.session.execute(text('''
+        SELECT indexrelname AS name, pg_size_pretty(pg_relation_size(indexrelid)) AS size
+        FROM pg_stat_user_indexes
+        WHERE relname = 'contact' AND indexrelname LIKE 'contact_embedding_%'
+        ORDER BY indexrelname
+    ''')).mappings().all()
+    table_size = db.session.execute(text("SELECT pg_size_pretty(pg_table_size('public.contact'))")).scalar()
+    coarse = app.config["COARSE_EMBEDDING_DIM"]
+    if coarse and not coarse_search_dim():
+        coarse = f"{coarse} (not backfilled; searches use the full vector)"
+    click.echo(f"active mode: {app.config['VECTOR_INDEX_MODE']}, coarse dim: {coarse}")
+    click.echo(f"table public.contact: {table_size}")
+    for r in rows:
+        click.echo(f"{r['name']}: {r['size']}")
+
+
+@app.cli.command("backfill-coarse")
+@click.option("--batch-size", default=1000, show_default=True)
+def backfill_coarse_embeddings(batch_size):
+    """Fill embedding_coarse for rows missing it or holding a different prefix length.
+
+    Searches stay on the full vector until this finishes and records the dimension.
+    """
+    dim = app.config["COARSE_EMBEDDING_DIM"]
+    if not dim:
+        raise click.UsageError("Set COARSE_EMBEDDING_DIM first.")
+    stale = "embedding IS NOT NULL AND (embedding_coarse IS NULL OR vector_dims(embedding_coarse) <> :dim)"
+    select_batch = text(f'''
+        SELECT id, embedding FROM public.contact
+        WHERE {stale} AND id > :after
+        ORDER BY id
+        LIMIT :batch_size
+    ''')
+    update = text("UPDATE public.contact SET embedding_coarse = :embedding_coarse WHERE id = :id")
+    after = 0
+    total = 0
+    while True:
+        rows = db.session.execute(select_batch, {"dim": dim, "after": after, "batch_size": batch_size}).all()
+        if not rows:
+            break
+        db.session.execute(update, [
+            {"id": row.id, "embedding_coarse": coarse_embedding(row.embedding.to_numpy(), dim)} for row in rows
+        ])
+        db.session.commit()
+        after = rows[-1].id
+        total += len(rows)
+        click.echo(f"{total} rows updated")
+    state = model_migration.get_state()
+    # Rows written while this ran got their prefix from the same COARSE_EMBEDDING_DIM
+    left = db.session.execute(text(f"SELECT COUNT(*) FROM public.contact WHERE {stale}"), {"dim": dim}).scalar()
+    if left:
+        db.session.rollback()
+        raise click.ClickException(f"{left} rows still lack a {dim}-dim coarse embedding; run this again.")
+    state.coarse_dim = dim
+    db.session.commit()
+    click.echo(f"Done: {total} rows now have a {dim}-dim coarse embedding; searches will use it.")
+
+
+@app.cli.command("backfill-embeddings")
+@click.option("--batch-size", default=64, show_default=True)
+@click.option("--backend", type=click.Choice(["torch", "onnx", "remote"]), default=None,
+              help="Embedder backend (default: EMBEDDER_BACKEND).")
+@click.option("--poll-interval", default=0.0, show_default=True,
+              help="Keep running, re-checking for pending rows every N seconds (0 = exit when done).")
+@click.option("--report-every", default=10.0, show_default=True, help="Seconds between progress lines.")
+@click.option("--processes", default=lambda: app.config["EMBEDDING_PROCESSES"], type=int,
+              show_default="EMBEDDING_PROCESSES", help="Split each batch across this many model processes.")
+def backfill_embeddings(batch_size, backend, poll_interval, report_every, processes):
+    """Embed contacts whose embedding is missing, from another model, or out of date.
+
+    Start several of these to go faster; batches are claimed with SKIP LOCKED.
+    """
+    processed, failed = backfill.run(batch_size, backend, poll_interval, report_every, processes, report=click.echo)
+    click.echo(f"Done: {processed} contacts embedded" + (f", {failed} batches failed (see log)" if failed else "."))
+
+
+@app.cli.command("import-contacts")
+@click.argument("csv_file", type=click.Path(exists=True, dir_okay=False))
+@click.option("--backend", type=click.Choice(["torch", "onnx", "remote"]), default=None,
+              help="Embedder backend (default: EMBEDDER_BACKEND).")
+@click.option("--processes", default=lambda: app.config["EMBEDDING_PROCESSES"], type=int,
+              show_default="EMBEDDING_PROCESSES", help="Encode across this many model processes (0 = in this one).")
+def import_contacts(csv_file, backend, processes):
+    """Import a contacts CSV the way POST /import_contacts does, for files too big for a web worker."""
+    try:
+        new_rows, skipped, total_rows = read_contacts_csv(csv_file)
+    except MissingColumns as e:
+        raise click.ClickException(str(e))
+    # Held until commit, so a cutover can't switch models while the file is encoded
+    model_name = lock_active_model()
+    embedder = backfill.make_embedder(model_name, backend, processes)
+    try:
+        created = write_contacts(new_rows, model_name, embedder)
+    finally:
+        if isinstance(embedder, ProcessPoolEmbedder):
+            embedder.close()
+    db.session.commit()
+    click.echo(f"Done: {created} contacts imported, {skipped} of {total_rows} rows skipped as duplicates.")
+
+
+@app.cli.command("adopt-profile-hashes")
+def adopt_profile_hashes():
+    """Record profile hashes for rows embedded before the hash columns existed.
+
+    Run once after upgrading; until then the backfill can't tell which of those rows were
+    edited since they were embedded.
+    """
+    adopted = backfill.adopt_profile_hashes()
+    click.echo(f"Recorded profile hashes for {adopted} up-to-date rows.")
+
+
+def prepared_statements_by_backend(sessions):
+    """{server backend pid: prepared statements on it}, from `sessions` transactions held open at once.
+
+    Holding them open together makes a transaction pooler give each one its own server
+    connection, so several backends are inspected rather than whichever one a single
+    session happens to land on.
+    """
+    barrier = threading.Barrier(sessions)
+
+    def inspect(_):
+        with app.app_context():
+            row = db.session.execute(text(
+                "SELECT pg_backend_pid() AS pid, (SELECT COUNT(*) FROM pg_prepared_statements) AS prepared"
+            )).one()
+            try:
+                barrier.wait(timeout=5)
+            except threading.BrokenBarrierError:
+                pass  # the pooler has fewer server connections than sessions; report the ones seen
+            db.session.commit()
+            return row
+
+    with concurrent.futures.ThreadPoolExecutor(sessions) as pool:
+        return {row.pid: row.prepared for row in pool.map(inspect, range(sessions))}
+
+
+@app.cli.command("pooler-check")
+@click.option("--transactions", default=200, show_default=True)
+@click.option("--concurrency", default=8, show_default=True)
+@click.option("--sessions", default=None, type=int, show_default="--concurrency",
+              help="Concurrent transactions that each inspect a server connection for prepared statements.")
+def pooler_check(transactions, concurrency, sessions):
+    """Check that the app keeps no session state on server connections.
+
+    Run it with DATABASE_URL pointing at the transaction pooler (e.g. the compose
+    `pgbouncer` profile): per-transaction settings must not leak into later
+    transactions, no prepared statements may be left behind on any of the server
+    connections inspected, and the server connection count should stay at the pooler's
+    pool size however many clients run.
+    """
+    engine = db.engine
+    marker = str(app.config["HNSW_EF_SEARCH"] + 7)
+
+    def run_transaction(i):
+        with app.app_context():
+            # The same statement every time, so psycopg would prepare it if allowed to
+            row = db.session.execute(text(
+                "SELECT pg_backend_pid() AS pid, current_setting('hnsw.ef_search', true) AS ef_search, "
+                "current_setting('statement_timeout') AS statement_timeout"
+            )).one()
+            set_ef_search(int(marker))
+            db.session.commit()
+            return row
+
+    with concurrent.futures.ThreadPoolExecutor(concurrency) as pool:
+        rows = list(pool.map(run_transaction, range(transactions)))
+
+    problems = []
+    leaked = sum(row.ef_search == marker for row in rows)
+    if leaked:
+        problems.append(f"hnsw.ef_search from an earlier transaction was visible {leaked} times")
+    if app.config["DB_STATEMENT_TIMEOUT_MS"]:
+        expected = f"{app.config['DB_STATEMENT_TIMEOUT_MS']}ms"
+        unset = sum(row.statement_timeout in ("0", "") for row in rows)
+        if unset:
+            problems.append(f"statement_timeout ({expected}) was not applied in {unset} transactions")
+    prepared = prepared_statements_by_backend(sessions or concurrency)
+    if any(prepared.values()):
+        problems.append(f"{sum(prepared.values())} prepared statements exist on "
+                        f"{sum(1 for count in prepared.values() if count)} of {len(prepared)} server connections")
+    server_connections = db.session.execute(text(
+        "SELECT COUNT(*) FROM pg_stat_activity WHERE datname = current_database() AND backend_type = 'client backend'"
+    )).scalar()
+    db.session.commit()
+
+    pool_size = app.config["SQLALCHEMY_ENGINE_OPTIONS"]["pool_size"]
+    click.echo(f"{transactions} transactions from {concurrency} threads ran on "
+               f"{len({row.pid for row in rows})} server connections "
+               f"(app pool: {pool_size} + {engine.pool._max_overflow} overflow)")
+    click.echo(f"Client backends on {engine.url.database}: {server_connections}")
+    click.echo(f"Checked {len(prepared)} server connections for prepared statements")
+    if problems:
+        for problem in problems:
+            click.echo(f"FAIL: {problem}", err=True)
+        raise SystemExit(1)
+    click.echo("OK: no session state leaked between transactions.")
+
+
+PARITY_SAMPLES = [
+    "Maya Thompson maya.thompson@example.com neighbor kids Lives in Apt 3B. Has a golden retriever named Sunny.",
+    "Jordan Reed jordan.reed@example.com coworker project Works on the marketing team.",
+    "Elena Garcia elena.garcia@example.com doctor clinic Primary care clinic. Best to call mornings.",
+    "Sam Patel sam.patel@example.com landlord repairs Text for urgent repairs (leaks, heating).",
+    "gym weekend coffee",
+    "building manager",
+    "",
+]
+
+
+@embedder_cli.command("export-onnx")
+@click.option("--output-dir", default=lambda: app.config["EMBEDDER_ONNX_DIR"], show_default="EMBEDDER_ONNX_DIR")
+@click.option("--model", default=MODEL_NAME, show_default=True)
+@click.option("--quantize/--no-quantize", default=True, show_default=True, help="Also write a dynamic int8 copy.")
+def export_onnx_command(output_dir, model, quantize):
+    """Export the embedding model for EMBEDDER_BACKEND=onnx."""
+    export_onnx(output_dir, model_name=model, quantize=quantize)
+    click.echo(f"Exported {model} to {output_dir}")
+
+
+@embedder_cli.command("parity")
+@click.option("--quantized/--no-quantized", default=lambda: app.config["EMBEDDER_ONNX_QUANTIZED"])
+@click.option("--from-db", default=200, show_default=True, help="Also compare this many stored profile strings.")
+@click.option("--min-cosine", default=0.99, show_default=True)
+def embedder_parity(quantized, from_db, min_cosine):
+    """Check ONNX embeddings against PyTorch ones (exits non-zero below --min-cosine)."""
+    texts = list(PARITY_SAMPLES)
+    if from_db:
+        texts += db.session.execute(text(
+            "SELECT search_text FROM public.contact WHERE search_text IS NOT NULL LIMIT :n"
+        ), {"n": from_db}).scalars().all()
+
+    reference = SentenceTransformerEmbedder(
+        MODEL_NAME, app.config["TORCH_INTRA_OP_THREADS"], app.config["TORCH_INTER_OP_THREADS"]
+    ).encode(texts)
+    candidate = OnnxEmbedder(
+        app.config["EMBEDDER_ONNX_DIR"], quantized=quantized, intra_op_threads=app.config["EMBEDDER_INTRA_OP_THREADS"]
+    ).encode(texts)
+    cosines = (reference * candidate).sum(axis=1)
+
+    click.echo(f"{len(texts)} texts, {'int8' if quantized else 'fp32'} ONNX vs PyTorch: "
+               f"min cosine {cosines.min():.4f}, mean {cosines.mean():.4f}")
+    if cosines.min() < min_cosine:
+        raise click.ClickException(f"Parity below {min_cosine}: {texts[int(cosines.argmin())]!r}")
+
+
+@embedder_cli.command("autotune-threads")
+@click.option("--workers", default=1, show_default=True,
+              help="Tune on one worker's share of the cores, as with CPU_AFFINITY=per-worker.")
+@click.option("--repeats", default=20, show_default=True, help="Encodes timed at each thread count.")
+def embedder_autotune_threads(workers, repeats):
+    """Time PyTorch encodes at 1, 2, 4, ... threads and print the TORCH_INTRA_OP_THREADS to use.
+
+    Run once per host type while the workers are idle, rather than in every worker at startup.
+    """
+    cpus = cpu_slice(0, workers)
+    pin_to_cpus(cpus)
+    embedder = create_embedder("torch", active_model_name())
+    timings = autotune_torch_threads(embedder.encode, repeats=repeats)
+    for threads, seconds in timings.items():
+        click.echo(f"{threads:>3} threads: {seconds * 1000:.2f} ms")
+    click.echo(f"TORCH_INTRA_OP_THREADS={min(timings, key=timings.get)} (on {len(cpus)} CPUs)")
+
+
+@model_cli.command("status")
+def embedding_model_status():
+    """Show the active model and the progress of any migration."""
+    state = model_migration.get_state()
+    db.session.commit()
+    click.echo(f"active: {state.active_model}")
+    if state.target_model:
+        done, total = model_migration.coverage(state.target_model)
+        click.echo(f"target: {state.target_model} ({done}/{total} contacts re-embedded)")
+
+
+@model_cli.command("reembed")
+@click.option("--target", type=click.Choice(list(EMBEDDING_MODELS)), required=True)
+@click.option("--batch-size", default=64, show_default=True)
+@click.option("--sleep", "sleep_seconds", default=0.0, show_default=True, help="Pause between batches, in seconds.")
+@click.option("--backend", type=click.Choice(["torch", "onnx", "remote"]), default=None,
+              help="Embedder backend for the target model (default: EMBEDDER_BACKEND).")
+def embedding_model_reembed(target, batch_size, sleep_seconds, backend):
+    """Write TARGET's vectors to the shadow table while search keeps serving the active model.
+
+    Safe to stop and re-run; each run only encodes contacts that are missing or changed.
+    """
+    try:
+        done, total = model_migration.reembed(target, batch_size, sleep_seconds, backend, report=click.echo)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    click.echo(f"Shadow table covers {done}/{total} contacts. Run `flask embedding-model cutover` to switch.")
+
+
+@model_cli.command("cutover")
+@click.option("--max-catch-up", default=1000, show_default=True,
+              help="Re-embed at most this many stragglers while holding the write lock.")
+@click.option("--allow-rewrite", is_flag=True,
+              help="Permit changing the embedding column's dimension (rewrites the table).")
+def embedding_model_cutover(max_catch_up, allow_rewrite):
+    """Make the target model active in one transaction."""
+    try:
+        model_migration.cutover(max_catch_up, allow_rewrite, report=click.echo)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+
+
+@model_cli.command("abort")
+def embedding_model_abort():
+    """Drop the migration's shadow vectors and keep the active model."""
+    model_migration.abort()
+    click.echo("Migration aborted.")
+
+
+app.cli.add_command(vector_index_cli)
+app.cli.add_command(embedder_cli)
+app.cli.add_command(model_cli)
@@ -1,7 +1,16 @@
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from flask_cors import CORS
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from pgvector.psycopg import register_vector
+from db_pool import TimedQueuePool
+from db_routing import RoutingSession, remember_write
+import instrumentation
+import json_responses
+import query_sampling
 import os
+import tempfile
 
 app = Flask(__name__)
 
@@ -19,14 +28,158 @@ CORS(
     supports_credentials=False,
 )
 
+
+def normalize_database_url(database_url):
+    # Normalize legacy scheme if necessary
+    if database_url.startswith("postgres://"):
+        database_url = database_url.replace("postgres://", "postgresql://", 1)
+
+    # Use psycopg 3 so vectors travel in pgvector's binary format instead of text literals
+    if database_url.startswith("postgresql://"):
+        database_url = database_url.replace("postgresql://", "postgresql+psycopg://", 1)
+    return database_url
+
+
 # Read DATABASE_URL from the environment if provided; otherwise use local Postgres
 database_url = os.environ.get("DATABASE_URL", "postgresql://gabriel@localhost:5432/contact_manager")
+app.config["SQLALCHEMY_DATABASE_URI"] = normalize_database_url(database_url)
 
-# Normalize legacy scheme if necessary
-if database_url.startswith("postgres://"):
-    database_url = database_url.replace("postgres://", "postgresql://", 1)
-
-app.config["SQLALCHEMY_DATABASE_URI"] = database_url
+# Optional read replicas (comma-separated URLs). Read-only endpoints pick one per request;
+# see db_routing.py. Each gets the same pool settings as the primary, and is named after
+# its bind key so pool metrics can tell them apart.
+read_urls = [url.strip() for url in os.environ.get("DATABASE_READ_URL", "").split(",") if url.strip()]
+app.config["SQLALCHEMY_BINDS"] = {
+    f"replica{i}": {"url": normalize_database_url(url), "pool_logging_name": f"replica{i}"}
+    for i, url in enumerate(read_urls)
+}
+app.config["DATABASE_REPLICA_BINDS"] = list(app.config["SQLALCHEMY_BINDS"])
+# After a write, that client's reads stay on the primary for this long (replication lag budget)
+app.config["DATABASE_READ_YOUR_WRITES_SECONDS"] = float(os.environ.get("DATABASE_READ_YOUR_WRITES_SECONDS", 5))
 app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
 
-db = SQLAlchemy(app)
\ No newline at end of file
+# Connection pool, per worker process: each worker may hold up to
+# DB_POOL_SIZE + DB_MAX_OVERFLOW connections, so keep workers * that below max_connections.
+app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
+    "poolclass": TimedQueuePool,
+    "pool_logging_name": "primary",
+    "pool_size": int(os.environ.get("DB_POOL_SIZE", 5)),
+    "max_overflow": int(os.environ.get("DB_MAX_OVERFLOW", 10)),
+    # Seconds a request waits for a free connection before failing
+    "pool_timeout": float(os.environ.get("DB_POOL_TIMEOUT", 30)),
+    # Replace connections older than this many seconds (-1 disables), ahead of server/proxy idle timeouts
+    "pool_recycle": int(os.environ.get("DB_POOL_RECYCLE", 1800)),
+    # Test each connection on checkout so a restarted database doesn't surface as request errors
+    "pool_pre_ping": os.environ.get("DB_POOL_PRE_PING", "true").lower() == "true",
+}
+# Server-side cap on any single statement, in milliseconds (0 = no limit)
+app.config["DB_STATEMENT_TIMEOUT_MS"] = int(os.environ.get("DB_STATEMENT_TIMEOUT_MS", 0))
+# Set when connecting through a transaction-pooling proxy (PgBouncer pool_mode=transaction).
+# Consecutive transactions may then run on different server connections, so nothing may
+# depend on session state: no server-side prepared statements, no startup options, and
+# settings only via SET LOCAL (see set_transaction_settings below).
+app.config["DB_TRANSACTION_POOLER"] = os.environ.get("DB_TRANSACTION_POOLER", "false").lower() == "true"
+if app.config["DB_TRANSACTION_POOLER"]:
+    # psycopg otherwise prepares a query on the server after its 5th execution
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"]["connect_args"] = {"prepare_threshold": None}
+elif app.config["DB_STATEMENT_TIMEOUT_MS"]:
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"]["connect_args"] = {
+        "options": f"-c statement_timeout={app.config['DB_STATEMENT_TIMEOUT_MS']}",
+    }
+# Flask-SQLAlchemy applies SQLALCHEMY_ENGINE_OPTIONS to the primary only; copy them to each replica
+for key, options in app.config["SQLALCHEMY_BINDS"].items():
+    app.config["SQLALCHEMY_BINDS"][key] = {**app.config["SQLALCHEMY_ENGINE_OPTIONS"], **options}
+
+# Model new databases start with. Once the database has an embedding_model_state row,
+# that row decides (see `flask embedding-model` for switching models without downtime).
+app.config["EMBEDDING_MODEL"] = os.environ.get("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+# How long workers cache the active model name before re-reading it
+app.config["EMBEDDING_STATE_TTL"] = float(os.environ.get("EMBEDDING_STATE_TTL", 5))
+
+# Embedding backend: "torch" (SentenceTransformer), "onnx" (ONNX Runtime) or "remote" (see embeddings.py)
+app.config["EMBEDDER_BACKEND"] = os.environ.get("EMBEDDER_BACKEND", "torch")
+app.config["EMBEDDER_ONNX_DIR"] = os.environ.get("EMBEDDER_ONNX_DIR", "onnx/all-MiniLM-L6-v2")
+app.config["EMBEDDER_ONNX_QUANTIZED"] = os.environ.get("EMBEDDER_ONNX_QUANTIZED", "false").lower() == "true"
+app.config["EMBEDDER_INTRA_OP_THREADS"] = int(os.environ.get("EMBEDDER_INTRA_OP_THREADS", 0))
+# PyTorch thread pools per worker (0 keeps torch's default of one thread per core).
+# See gunicorn.conf.py for CPU_AFFINITY=per-worker pinning.
+app.config["TORCH_INTRA_OP_THREADS"] = int(os.environ.get("TORCH_INTRA_OP_THREADS", 0))
+app.config["TORCH_INTER_OP_THREADS"] = int(os.environ.get("TORCH_INTER_OP_THREADS", 0))
+
+# Default for `flask backfill-embeddings --processes` and `flask import-contacts --processes`:
+# model processes per command (0 = in-process), each with EMBEDDING_PROCESS_THREADS
+# torch/BLAS threads. See parallel_embedding.py.
+app.config["EMBEDDING_PROCESSES"] = int(os.environ.get("EMBEDDING_PROCESSES", 0))
+app.config["EMBEDDING_PROCESS_THREADS"] = int(os.environ.get("EMBEDDING_PROCESS_THREADS", 1))
+
+# EMBEDDER_BACKEND=remote talks to embedding_server.py. The batch knobs apply to its
+# micro-batcher, and to the in-process one in front of generate_embedding when
+# EMBEDDING_BATCHING=true (useful with threaded gunicorn workers).
+app.config["EMBEDDING_BATCHING"] = os.environ.get("EMBEDDING_BATCHING", "false").lower() == "true"
+app.config["EMBEDDER_URL"] = os.environ.get("EMBEDDER_URL", "http://127.0.0.1:5100")
+app.config["EMBEDDER_TIMEOUT"] = float(os.environ.get("EMBEDDER_TIMEOUT", 10))
+app.config["EMBEDDING_BATCH_MAX_SIZE"] = int(os.environ.get("EMBEDDING_BATCH_MAX_SIZE", 32))
+app.config["EMBEDDING_BATCH_MAX_WAIT_MS"] = float(os.environ.get("EMBEDDING_BATCH_MAX_WAIT_MS", 5))
+
+# ASGI mode (asgi.py): threads running model encodes for the async routes (0 = auto: enough
+# to fill a micro-batch when EMBEDDING_BATCHING is on, otherwise 2), and how many encodes
+# may wait for one before /semantic_search answers 503
+app.config["ASGI_ENCODE_THREADS"] = int(os.environ.get("ASGI_ENCODE_THREADS", 0))
+app.config["ASGI_MAX_PENDING_ENCODES"] = int(os.environ.get("ASGI_MAX_PENDING_ENCODES", 256))
+
+# Vector search: "exact" scans every row; "vector", "halfvec" and "bit" use the HNSW index
+# built by `flask vector-index create --mode <mode>`. The quantized modes fetch
+# ANN_CANDIDATES rows from the compact index and rescore them with the float32 embeddings.
+app.config["VECTOR_INDEX_MODE"] = os.environ.get("VECTOR_INDEX_MODE", "exact")
+app.config["ANN_CANDIDATES"] = int(os.environ.get("ANN_CANDIDATES", 100))
+app.config["HNSW_EF_SEARCH"] = int(os.environ.get("HNSW_EF_SEARCH", 40))
+# Length of the truncated embedding prefix used for a coarse first pass (0 disables it)
+app.config["COARSE_EMBEDDING_DIM"] = int(os.environ.get("COARSE_EMBEDDING_DIM", 0))
+
+# Per-request timing (instrumentation.py): SERVER_TIMING=true adds a Server-Timing header to
+# every response (off by default: it tells any client how long each phase took), and
+# REQUEST_LOG=true writes one JSON line per request (route, status, phase timings)
+app.config["SERVER_TIMING"] = os.environ.get("SERVER_TIMING", "false").lower() == "true"
+app.config["REQUEST_LOG"] = os.environ.get("REQUEST_LOG", "false").lower() == "true"
+
+# Slow-query capture (query_sampling.py): the share of search requests whose queries are
+# timed, the latency above which a sampled query's plan is captured, and how many recent
+# plans /admin/slow_queries keeps. Off by default, as EXPLAIN ANALYZE re-runs the query.
+app.config["QUERY_SAMPLE_RATE"] = float(os.environ.get("QUERY_SAMPLE_RATE", 0))
+app.config["SLOW_QUERY_MS"] = float(os.environ.get("SLOW_QUERY_MS", 100))
+app.config["SLOW_QUERY_BUFFER"] = int(os.environ.get("SLOW_QUERY_BUFFER", 50))
+
+# Sampling profiler (profiler.py): where finished profiles are written (shared by the
+# workers of one container) and the longest profile /admin/profile will start
+app.config["PROFILE_DIR"] = os.environ.get("PROFILE_DIR", os.path.join(tempfile.gettempdir(), "findtact-profiles"))
+app.config["PROFILE_MAX_SECONDS"] = int(os.environ.get("PROFILE_MAX_SECONDS", 300))
+
+# JSON encoding (json_responses.py): "orjson" (when installed) or "stdlib". GET /contacts
+# pages of at least STREAM_JSON_MIN_ROWS rows are streamed from a server-side cursor.
+app.config["JSON_BACKEND"] = os.environ.get("JSON_BACKEND", "orjson")
+app.config["STREAM_JSON_MIN_ROWS"] = int(os.environ.get("STREAM_JSON_MIN_ROWS", 500))
+
+# Bearer token for the /admin endpoints; they answer 404 while it is unset
+app.config["ADMIN_TOKEN"] = os.environ.get("ADMIN_TOKEN", "")
+
+db = SQLAlchemy(app, session_options={"class_": RoutingSession})
+app.after_request(remember_write)
+instrumentation.init_app(app)
+json_responses.init_app(app)
+query_sampling.init_app(app)
+
+
+@event.listens_for(Engine, "connect")
+def register_vector_adapters(dbapi_connection, connection_record):
+    # Teach each new psycopg connection to send/receive vector, halfvec and bit natively,
+    # so NumPy float32 arrays can be passed as query parameters directly.
+    register_vector(dbapi_connection)
+
+
+@event.listens_for(Engine, "begin")
+def set_transaction_settings(conn):
+    # Behind a transaction pooler the startup option can't be used (and a plain SET would
+    # leak to whichever client gets the server connection next), so apply it per transaction
+    if not (app.config["DB_TRANSACTION_POOLER"] and app.config["DB_STATEMENT_TIMEOUT_MS"]):
+        return
+    if conn.get_execution_options().get("isolation_level") != "AUTOCOMMIT":
+        conn.exec_driver_sql(f"SET LOCAL statement_timeout = {app.config['DB_STATEMENT_TIMEOUT_MS']}")
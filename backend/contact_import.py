@@ -0,0 +1,91 @@
+"""CSV contact import, shared by POST /import_contacts and `flask import-contacts`.
+
+The route encodes in its web worker. The CLI command can encode across a
+ProcessPoolEmbedder instead (parallel_embedding.py), for files too big to import over HTTP.
+"""
+import datetime
+import pandas as pd
+from models import Contact, copy_contacts
+from embeddings import build_profile_string, generate_embeddings
+
+REQUIRED_COLUMNS = ["first_name", "last_name", "email"]
+
+
+class MissingColumns(ValueError):
+    """The CSV lacks one of REQUIRED_COLUMNS."""
+
+
+def read_contacts_csv(file):
+    """Parse a contacts CSV into rows for write_contacts.
+
+    Returns (new rows, rows skipped as duplicates, total rows). Raises MissingColumns if a
+    required column is missing.
+    """
+    df = pd.read_csv(file)
+
+    missing_cols = [col for col in REQUIRED_COLUMNS if col not in df.columns]
+    if missing_cols:
+        raise MissingColumns(f"Missing required columns: {missing_cols}")
+
+    # Clean data using pandas
+    df = df.fillna("")  # Replace NaN with empty strings
+    df["first_name"] = df["first_name"].astype(str).str.strip()
+    df["last_name"] = df["last_name"].astype(str).str.strip()
+    df["email"] = df["email"].astype(str).str.strip().str.lower()
+
+    skipped = 0
+    new_rows = []
+    seen_emails = set()
+
+    for idx, row in df.iterrows():
+        # Skip if email already exists (in the database or earlier in this file)
+        if row["email"] in seen_emails or Contact.query.filter_by(email=row["email"]).first():
+            skipped += 1
+            continue
+        seen_emails.add(row["email"])
+
+        # Parse tags from semicolon-separated string
+        tags = []
+        if "tags" in row and row["tags"]:
+            tags = [t.strip() for t in str(row["tags"]).split(";") if t.strip()]
+
+        # As stored in the text column, so search_text matches the profile hash computed in SQL
+        notes = str(row.get("notes", "")) if "notes" in df.columns else ""
+
+        profile_string = build_profile_string(
+            row["first_name"],
+            row["last_name"],
+            row["email"],
+            tags,
+            notes
+        )
+
+        new_rows.append({
+            "first_name": row["first_name"],
+            "last_name": row["last_name"],
+            "email": row["email"],
+            "tags": tags if tags else None,
+            "notes": notes if notes else None,
+            "search_text": profile_string,
+        })
+
+    return new_rows, skipped, len(df)
+
+
+def write_contacts(new_rows, model_name=None, embedder=None):
+    """Embed `new_rows` and COPY them into the contact table; the caller commits.
+
+    Without `model_name`, the active model is locked for this transaction. An `embedder`
+    (for `model_name`) replaces the worker's own, e.g. a ProcessPoolEmbedder.
+    """
+    # Encode the whole file in batches
+    embeddings, embedding_model_name = generate_embeddings(
+        [r["search_text"] for r in new_rows], model_name, for_write=True, embedder=embedder
+    )
+    # Binary COPY writes the timestamp verbatim, so pass naive UTC
+    embedded_at = datetime.datetime.now(datetime.UTC).replace(tzinfo=None)
+    for new_row, embedding in zip(new_rows, embeddings):
+        new_row.update(embedding=embedding, embedding_model=embedding_model_name, embedded_at=embedded_at)
+
+    # One binary COPY instead of an INSERT (and vector text literal) per row
+    return copy_contacts(new_rows)
@@ -0,0 +1,75 @@
+"""CPU thread pool sizing and pinning for the embedding model.
+
+With several gunicorn workers on one host, PyTorch's default (one intra-op thread per
+core in every worker) oversubscribes the CPUs and makes encode latency erratic.
+These helpers give each worker a fixed thread budget and, optionally, its own cores.
+"""
+import os
+import statistics
+import time
+
+BLAS_THREAD_VARS = ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS")
+
+
+def configure_blas_threads(threads):
+    """Cap OpenMP/MKL/OpenBLAS pools. Must run before numpy or torch is imported."""
+    if threads:
+        for var in BLAS_THREAD_VARS:
+            os.environ.setdefault(var, str(threads))
+
+
+def cpu_slice(slot, slots, cpus=None):
+    """The cores worker `slot` of `slots` should use: an even, disjoint share of `cpus`."""
+    cpus = sorted(cpus if cpus is not None else os.sched_getaffinity(0))
+    per_slot = max(1, len(cpus) // slots)
+    start = (slot * per_slot) % len(cpus)
+    return cpus[start:start + per_slot]
+
+
+def pin_to_cpus(cpus):
+    os.sched_setaffinity(0, cpus)
+
+
+def apply_torch_threads(intra_op_threads=0, inter_op_threads=0):
+    """Size torch's thread pools; 0 keeps torch's default for that pool."""
+    import torch
+
+    if intra_op_threads:
+        torch.set_num_threads(intra_op_threads)
+    if inter_op_threads:
+        try:
+            torch.set_num_interop_threads(inter_op_threads)
+        except RuntimeError:
+            # Only allowed once, before any inter-op parallel work has started
+            pass
+
+
+def autotune_torch_threads(encode, candidates=None, repeats=20, sample="gym buddy who likes weekend coffee"):
+    """Pick the intra-op thread count with the lowest median single-string encode latency.
+
+    Tries each count in `candidates` (default: 1, 2, 4, ... up to the cores this process
+    may run on), leaves torch set to the winner and returns {threads: median_seconds}.
+    """
+    import torch
+
+    available = len(os.sched_getaffinity(0))
+    if candidates is None:
+        candidates, n = [], 1
+        while n < available:
+            candidates.append(n)
+            n *= 2
+        candidates.append(available)
+
+    timings = {}
+    for threads in candidates:
+        torch.set_num_threads(threads)
+        encode([sample])  # warm up the pool at this size
+        samples = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            encode([sample])
+            samples.append(time.perf_counter() - start)
+        timings[threads] = statistics.median(samples)
+
+    torch.set_num_threads(min(timings, key=timings.get))
+    return timings
@@ -0,0 +1,53 @@
+"""SQLAlchemy connection pool with checkout timing, and a snapshot of its state."""
+import time
+from sqlalchemy import exc
+from sqlalchemy.pool import QueuePool
+import metrics
+
+CHECKOUT_SECONDS = metrics.histogram(
+    "db_pool_checkout_seconds",
+    "Time to get a connection from the pool, including waiting for a free one, connecting and pre-ping",
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+CHECKOUT_TIMEOUTS = metrics.counter(
+    "db_pool_checkout_timeouts_total",
+    "Checkouts that gave up after DB_POOL_TIMEOUT seconds",
+)
+
+
+def pool_label(pool):
+    """The metrics label of `pool`: its engine's pool_logging_name (the bind key for replicas)."""
+    return pool.logging_name or "default"
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool that records how long each checkout takes and how many time out, per pool."""
+
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            return super().connect()
+        except exc.TimeoutError:
+            CHECKOUT_TIMEOUTS.inc(pool=pool_label(self))
+            raise
+        finally:
+            CHECKOUT_SECONDS.observe(time.perf_counter() - start, pool=pool_label(self))
+
+
+def pool_stats(pool):
+    """Live counts for `pool` plus this process's checkout timings for it."""
+    stats = {"pool_class": type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        stats.update({
+            "size": pool.size(),
+            "checked_in": pool.checkedin(),
+            "checked_out": pool.checkedout(),
+            # QueuePool counts from -size until the pool has been filled once
+            "overflow": max(0, pool.overflow()),
+            "max_overflow": pool._max_overflow,
+            "timeout": pool.timeout(),
+        })
+    label = pool_label(pool)
+    stats["checkout_seconds"] = [s for s in CHECKOUT_SECONDS.to_json() if s["labels"].get("pool") == label]
+    stats["checkout_timeouts"] = sum(s["value"] for s in CHECKOUT_TIMEOUTS.to_json() if s["labels"].get("pool") == label)
+    return stats
@@ -0,0 +1,53 @@
+"""Send read-only endpoints to read replicas (DATABASE_READ_URL).
+
+Views decorated with `read_only` run their queries against one replica, chosen per
+request. Everything else, and any flush, goes to the primary. A client that wrote within
+the last DATABASE_READ_YOUR_WRITES_SECONDS keeps reading from the primary, so it sees
+its own changes despite replication lag.
+"""
+import functools
+import random
+import time
+from flask import current_app, g, has_request_context, request
+from flask_sqlalchemy.session import Session
+
+LAST_WRITE_COOKIE = "db_last_write"
+WRITE_METHODS = ("POST", "PUT", "PATCH", "DELETE")
+
+
+class RoutingSession(Session):
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and has_request_context() and g.get("db_replica"):
+            return self._db.engines[g.db_replica]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def wrote_recently(cookies, window):
+    """Whether the request's cookies show a write less than `window` seconds ago."""
+    try:
+        last_write = float(cookies.get(LAST_WRITE_COOKIE, 0))
+    except ValueError:
+        return False
+    return time.time() - last_write < window
+
+
+def read_only(view):
+    """Route this view's queries to a replica, unless the client wrote recently."""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        g.db_read_only = True
+        replicas = current_app.config["DATABASE_REPLICA_BINDS"]
+        if replicas and not wrote_recently(request.cookies, current_app.config["DATABASE_READ_YOUR_WRITES_SECONDS"]):
+            g.db_replica = random.choice(replicas)
+        return view(*args, **kwargs)
+    return wrapper
+
+
+def remember_write(response):
+    """after_request hook: start the read-your-writes window after a successful write."""
+    window = current_app.config["DATABASE_READ_YOUR_WRITES_SECONDS"]
+    if (current_app.config["DATABASE_REPLICA_BINDS"] and window
+            and request.method in WRITE_METHODS and not g.get("db_read_only") and response.status_code < 400):
+        response.set_cookie(LAST_WRITE_COOKIE, f"{time.time():.3f}", max_age=int(window) + 1,
+                            httponly=True, samesite="Lax")
+    return response
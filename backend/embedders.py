@@ -0,0 +1,225 @@
+"""Embedding model backends, without the app's configuration.
+
+Every backend returns unit-length float32 arrays of shape (n, dimension) from `encode`,
+so callers never normalize again: the buffers go to pgvector and NumPy as they are.
+
+This module doesn't import config, so embedding_server.py and the parallel_embedding
+worker processes can build an embedder without creating the Flask app or a DB engine.
+embeddings.create_embedder builds one from the app's settings.
+"""
+import abc
+import hashlib
+import json
+import os
+import threading
+from http.client import HTTPConnection, RemoteDisconnected
+from urllib.parse import urlsplit
+import numpy as np
+from cpu_tuning import apply_torch_threads
+from model_registry import embedding_dimension
+
+MODEL_NAME = "all-MiniLM-L6-v2"  # 384-dim vectors; see model_registry.py for others
+MAX_SEQ_LENGTH = 256  # SentenceTransformer's default for this model
+
+ONNX_MODEL_FILE = "model.onnx"
+ONNX_QUANTIZED_FILE = "model_int8.onnx"
+ONNX_META_FILE = "embedder.json"
+
+
+class Embedder(abc.ABC):
+    """Base class for embedding backends."""
+    model_name = MODEL_NAME
+    dimension = 384
+
+    @abc.abstractmethod
+    def encode(self, texts, batch_size=32):
+        """Unit-length float32 array of shape (len(texts), dimension)."""
+
+
+class SentenceTransformerEmbedder(Embedder):
+    def __init__(self, model_name=MODEL_NAME, intra_op_threads=0, inter_op_threads=0):
+        from sentence_transformers import SentenceTransformer
+
+        apply_torch_threads(intra_op_threads, inter_op_threads)
+        self.model_name = model_name
+        self.model = SentenceTransformer(model_name)
+        self.dimension = self.model.get_sentence_embedding_dimension()
+
+    def encode(self, texts, batch_size=32):
+        texts = list(texts)
+        if not texts:
+            # SentenceTransformer returns a flat empty array here
+            return np.empty((0, self.dimension), dtype=np.float32)
+        return self.model.encode(
+            texts, batch_size=batch_size, convert_to_numpy=True, normalize_embeddings=True
+        ).astype(np.float32, copy=False)
+
+
+class OnnxEmbedder(Embedder):
+    """Transformer forward pass in ONNX Runtime plus mean pooling, as SentenceTransformer does."""
+
+    def __init__(self, model_dir, quantized=False, intra_op_threads=0):
+        try:
+            import onnxruntime as ort
+            from transformers import AutoTokenizer
+        except ImportError as e:
+            raise RuntimeError("EMBEDDER_BACKEND=onnx needs the onnxruntime and transformers packages") from e
+
+        with open(os.path.join(model_dir, ONNX_META_FILE)) as f:
+            meta = json.load(f)
+        self.model_name = meta["model_name"]
+        self.dimension = meta["dimension"]
+        self.max_seq_length = meta["max_seq_length"]
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        # 0 lets ONNX Runtime use one thread per physical core
+        options.intra_op_num_threads = intra_op_threads
+        options.inter_op_num_threads = 1
+        model_file = ONNX_QUANTIZED_FILE if quantized else ONNX_MODEL_FILE
+        self.session = ort.InferenceSession(
+            os.path.join(model_dir, model_file), options, providers=["CPUExecutionProvider"]
+        )
+        self.input_names = [i.name for i in self.session.get_inputs()]
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+
+    def encode(self, texts, batch_size=32):
+        texts = list(texts)
+        out = np.empty((len(texts), self.dimension), dtype=np.float32)
+        for start in range(0, len(texts), batch_size):
+            batch = texts[start:start + batch_size]
+            tokens = self.tokenizer(
+                batch, padding=True, truncation=True, max_length=self.max_seq_length, return_tensors="np"
+            )
+            feed = {name: tokens[name].astype(np.int64) for name in self.input_names}
+            token_embeddings = self.session.run(None, feed)[0]
+            # Mean pooling over real (non-padding) tokens
+            mask = tokens["attention_mask"][..., None].astype(np.float32)
+            summed = (token_embeddings * mask).sum(axis=1)
+            pooled = summed / np.clip(mask.sum(axis=1), 1e-9, None)
+            pooled /= np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+            out[start:start + len(batch)] = pooled
+        return out
+
+
+class RemoteEmbedder(Embedder):
+    """Client for embedding_server.py. Keeps one keep-alive connection per thread."""
+
+    def __init__(self, url, timeout=10):
+        parts = urlsplit(url)
+        self.host, self.port, self.timeout = parts.hostname, parts.port or 80, timeout
+        self._local = threading.local()
+        info = json.loads(self._request("GET", "/health"))
+        self.model_name = info["model"]
+        self.dimension = info["dimension"]
+
+    def _request(self, method, path, body=None):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = HTTPConnection(self.host, self.port, timeout=self.timeout)
+        headers = {"Content-Type": "application/json"} if body is not None else {}
+        try:
+            try:
+                conn.request(method, path, body=body, headers=headers)
+                response = conn.getresponse()
+            except (RemoteDisconnected, BrokenPipeError, ConnectionResetError):
+                # The server closed an idle keep-alive connection before reading the request;
+                # nothing was received, so retry once on a fresh one
+                conn.close()
+                conn.request(method, path, body=body, headers=headers)
+                response = conn.getresponse()
+            data = response.read()
+        except Exception:
+            # Timeouts and errors mid-response leave the connection unusable; don't retry them
+            conn.close()
+            raise
+        if response.status != 200:
+            raise RuntimeError(f"Embedding server returned {response.status}: {data[:200]!r}")
+        return data
+
+    def encode(self, texts, batch_size=32):
+        data = self._request("POST", "/embed", json.dumps({"texts": list(texts)}).encode())
+        return np.frombuffer(data, dtype="<f4").reshape(-1, self.dimension)
+
+
+class RandomEmbedder(Embedder):
+    """Unit vectors seeded from each text's hash: the same text always gets the same vector.
+
+    For benchmarks and load tests that should not download a model. Similarities between
+    these vectors mean nothing.
+    """
+
+    def __init__(self, model_name=MODEL_NAME):
+        self.model_name = model_name
+        self.dimension = embedding_dimension(model_name)
+
+    def encode(self, texts, batch_size=32):
+        texts = list(texts)
+        out = np.empty((len(texts), self.dimension), dtype=np.float32)
+        for i, t in enumerate(texts):
+            seed = int.from_bytes(hashlib.blake2b(t.encode(), digest_size=8).digest(), "little")
+            vector = np.random.default_rng(seed).standard_normal(self.dimension, dtype=np.float32)
+            out[i] = vector / np.linalg.norm(vector)
+        return out
+
+
+def export_onnx(model_dir, model_name=MODEL_NAME, quantize=True):
+    """Export the SentenceTransformer's transformer to ONNX (and an int8 copy) in model_dir."""
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    os.makedirs(model_dir, exist_ok=True)
+    st_model = SentenceTransformer(model_name, device="cpu")
+    transformer = st_model[0].auto_model.eval()
+    tokenizer = st_model.tokenizer
+
+    sample = tokenizer(["export sample"], return_tensors="pt")
+    input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in sample]
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+    dynamic_axes["last_hidden_state"] = {0: "batch", 1: "sequence"}
+    model_path = os.path.join(model_dir, ONNX_MODEL_FILE)
+    with torch.no_grad():
+        torch.onnx.export(
+            transformer,
+            tuple(sample[name] for name in input_names),
+            model_path,
+            input_names=input_names,
+            output_names=["last_hidden_state"],
+            dynamic_axes=dynamic_axes,
+            opset_version=17,
+        )
+
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        quantize_dynamic(model_path, os.path.join(model_dir, ONNX_QUANTIZED_FILE), weight_type=QuantType.QInt8)
+
+    tokenizer.save_pretrained(model_dir)
+    with open(os.path.join(model_dir, ONNX_META_FILE), "w") as f:
+        json.dump({
+            "model_name": model_name,
+            "dimension": st_model.get_sentence_embedding_dimension(),
+            "max_seq_length": st_model.max_seq_length or MAX_SEQ_LENGTH,
+        }, f, indent=2)
+
+
+def build_embedder(backend, model_name, onnx_dir=None, onnx_quantized=False, intra_op_threads=0,
+                   torch_threads=(0, 0), url=None, timeout=10):
+    """An embedder for `backend` serving `model_name`.
+
+    Raises ValueError if an ONNX export or embedding server was built for another model.
+    """
+    if backend == "torch":
+        return SentenceTransformerEmbedder(model_name, *torch_threads)
+    if backend == "random":
+        return RandomEmbedder(model_name)
+    if backend == "onnx":
+        embedder = OnnxEmbedder(onnx_dir, quantized=onnx_quantized, intra_op_threads=intra_op_threads)
+    elif backend == "remote":
+        embedder = RemoteEmbedder(url, timeout=timeout)
+    else:
+        raise ValueError(f"Unknown EMBEDDER_BACKEND: {backend}")
+    # ONNX exports and embedding servers are built for one model; never mix vector spaces
+    if embedder.model_name != model_name:
+        raise ValueError(f"{backend} embedder serves {embedder.model_name!r}, not {model_name!r}")
+    return embedder
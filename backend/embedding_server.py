@@ -0,0 +1,140 @@
+"""Standalone embedding server that owns the model for every backend worker.
+
+    python embedding_server.py --port 5100 --backend onnx
+
+Then run the Flask app with EMBEDDER_BACKEND=remote EMBEDDER_URL=http://127.0.0.1:5100.
+Requests from all workers are coalesced by a MicroBatcher, so throughput grows with batch
+size instead of with the number of model copies.
+
+The server reads the same environment variables as the app for its defaults (EMBEDDING_MODEL,
+EMBEDDER_ONNX_DIR, EMBEDDING_BATCH_MAX_SIZE, ...), but doesn't import the app itself.
+
+POST /embed   {"texts": [...]}  ->  raw little-endian float32 bytes, shape (len(texts), dimension)
+GET  /health                    ->  {"model": ..., "dimension": ..., "batching": {...}}
+"""
+import argparse
+import json
+import logging
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from batching import MicroBatcher
+from embedders import build_embedder
+
+logger = logging.getLogger("embedding_server")
+
+
+class EmbeddingRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, so clients reuse one connection per thread
+
+    def _send(self, status, body, content_type, headers=None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_json(self, status, payload):
+        self._send(status, json.dumps(payload).encode(), "application/json")
+
+    def do_GET(self):
+        if self.path != "/health":
+            return self._send_json(404, {"message": "Not found"})
+        embedder = self.server.embedder
+        self._send_json(200, {
+            "model": embedder.model_name,
+            "dimension": embedder.dimension,
+            "batching": self.server.batcher.stats(),
+        })
+
+    def do_POST(self):
+        if self.path != "/embed":
+            return self._send_json(404, {"message": "Not found"})
+        try:
+            payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+            texts = payload["texts"]
+            if not isinstance(texts, list) or not all(isinstance(t, str) for t in texts):
+                raise ValueError("texts must be a list of strings")
+        except (ValueError, KeyError, TypeError) as e:
+            return self._send_json(400, {"message": str(e)})
+
+        try:
+            embeddings = self.server.batcher.encode(texts).astype("<f4", copy=False)
+        except Exception:
+            logger.exception("Encoding %d texts failed", len(texts))
+            return self._send_json(500, {"message": "Encoding failed."})
+        self._send(200, embeddings.tobytes(), "application/octet-stream", {
+            "X-Embedding-Model": self.server.embedder.model_name,
+            "X-Embedding-Dimension": str(self.server.embedder.dimension),
+        })
+
+    def log_message(self, format, *args):
+        pass  # one line per request is too noisy at search rates
+
+
+class EmbeddingServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # Every worker thread of every app process keeps a connection; socketserver's default
+    # listen backlog of 5 resets connects that arrive together
+    request_queue_size = 128
+
+
+def make_server(embedder, host="127.0.0.1", port=0, max_batch_size=32, max_wait_ms=5):
+    """Build an embedding server around `embedder` (port 0 picks a free port)."""
+    server = EmbeddingServer((host, port), EmbeddingRequestHandler)
+    server.embedder = embedder
+    server.batcher = MicroBatcher(
+        lambda texts: embedder.encode(texts, batch_size=len(texts)),
+        max_batch_size=max_batch_size,
+        max_wait_ms=max_wait_ms,
+        name="server",
+    )
+    return server
+
+
+def serve_in_thread(embedder, **kwargs):
+    """In-process stand-in for the embedding server, e.g. for tests and benchmarks.
+
+    Returns (server, url); point a RemoteEmbedder at the url and call server.shutdown() when done.
+    """
+    server = make_server(embedder, **kwargs)
+    threading.Thread(target=server.serve_forever, name="embedding-server", daemon=True).start()
+    host, port = server.server_address[:2]
+    return server, f"http://{host}:{port}"
+
+
+def main():
+    env = os.environ.get
+    parser = argparse.ArgumentParser(description="Serve embeddings over HTTP with micro-batching.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5100)
+    parser.add_argument("--backend", default="torch", choices=["torch", "onnx"])
+    parser.add_argument("--model", default=env("EMBEDDING_MODEL", "all-MiniLM-L6-v2"), help="default: EMBEDDING_MODEL")
+    parser.add_argument("--onnx-dir", default=env("EMBEDDER_ONNX_DIR", "onnx/all-MiniLM-L6-v2"),
+                        help="default: EMBEDDER_ONNX_DIR")
+    parser.add_argument("--quantized", action="store_true",
+                        default=env("EMBEDDER_ONNX_QUANTIZED", "false").lower() == "true",
+                        help="default: EMBEDDER_ONNX_QUANTIZED")
+    parser.add_argument("--max-batch-size", type=int, default=int(env("EMBEDDING_BATCH_MAX_SIZE", 32)),
+                        help="default: EMBEDDING_BATCH_MAX_SIZE")
+    parser.add_argument("--max-wait-ms", type=float, default=float(env("EMBEDDING_BATCH_MAX_WAIT_MS", 5)),
+                        help="default: EMBEDDING_BATCH_MAX_WAIT_MS")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    embedder = build_embedder(
+        args.backend, args.model,
+        onnx_dir=args.onnx_dir,
+        onnx_quantized=args.quantized,
+        intra_op_threads=int(env("EMBEDDER_INTRA_OP_THREADS", 0)),
+        torch_threads=(int(env("TORCH_INTRA_OP_THREADS", 0)), int(env("TORCH_INTER_OP_THREADS", 0))),
+    )
+    server = make_server(embedder, args.host, args.port, args.max_batch_size, args.max_wait_ms)
+    logger.info("Serving %s (%s) on http://%s:%s", embedder.model_name, args.backend, args.host, args.port)
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
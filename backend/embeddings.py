@@ -0,0 +1,179 @@
+"""Embedding for the app: which model is active, and the process-wide embedders and batchers.
+
+EMBEDDER_BACKEND picks how profile strings are encoded (the backends are in embedders.py):
+
+- "torch": SentenceTransformer on PyTorch (the default)
+- "onnx": the same model exported to ONNX and run with ONNX Runtime, optionally
+  int8-quantized. Export it once with `flask --app main embedder export-onnx`.
+- "remote": a shared embedding_server.py process at EMBEDDER_URL
+- "random": deterministic random unit vectors, for benchmarks; no model is loaded
+
+Every backend returns unit-length float32 arrays of shape (n, dimension) from `encode`,
+so callers never normalize again: the buffers go to pgvector and NumPy as they are.
+"""
+import threading
+import time
+from collections import namedtuple
+import numpy as np
+from sqlalchemy import select
+from batching import MicroBatcher
+from config import app, db
+from embedders import build_embedder
+from models import EmbeddingModelState
+from instrumentation import phase
+from model_registry import embedding_dimension
+
+# A float32 vector (or (n, dim) matrix) and the model that produced it. Unpacks like the
+# (embedding, model name) tuples this module used to return.
+EmbeddingResult = namedtuple("EmbeddingResult", ["embedding", "model_name"])
+
+
+def embedder_settings():
+    """build_embedder keyword arguments from the app config."""
+    return {
+        "onnx_dir": app.config["EMBEDDER_ONNX_DIR"],
+        "onnx_quantized": app.config["EMBEDDER_ONNX_QUANTIZED"],
+        "intra_op_threads": app.config["EMBEDDER_INTRA_OP_THREADS"],
+        "torch_threads": (app.config["TORCH_INTRA_OP_THREADS"], app.config["TORCH_INTER_OP_THREADS"]),
+        "url": app.config["EMBEDDER_URL"],
+        "timeout": app.config["EMBEDDER_TIMEOUT"],
+    }
+
+
+def create_embedder(backend=None, model_name=None):
+    return build_embedder(
+        backend or app.config["EMBEDDER_BACKEND"], model_name or app.config["EMBEDDING_MODEL"], **embedder_settings()
+    )
+
+
+_embedders = {}
+_batchers = {}
+_init_lock = threading.Lock()
+_model_state = (None, None, 0.0)  # (active model, coarse_dim, time.monotonic() when read)
+
+
+def active_model_name(refresh=False):
+    """The model whose vectors `contact.embedding` holds, re-read every EMBEDDING_STATE_TTL seconds.
+
+    While a re-embedding migration is running, the target model is loaded in the
+    background so the first search after cutover doesn't wait for it.
+    """
+    return _read_model_state(refresh)[0]
+
+
+def coarse_search_dim():
+    """COARSE_EMBEDDING_DIM once `flask backfill-coarse` has filled it for every row, else 0.
+
+    Until then searches take the full-vector path, so rows without a coarse prefix (or
+    with one of another size) don't silently drop out of the results.
+    """
+    dim = app.config["COARSE_EMBEDDING_DIM"]
+    return dim if dim and _read_model_state()[1] == dim else 0
+
+
+def lock_active_model():
+    """The active model, read with FOR SHARE so a cutover can't commit before this transaction does.
+
+    Write paths call this before writing vectors to (or otherwise touching) `public.contact`:
+    cutover locks the state row first and the table second, so the same order here can't
+    deadlock with it. A cached model name may be up to EMBEDDING_STATE_TTL seconds stale;
+    this one is current until commit.
+    """
+    return _read_model_state(refresh=True, lock=True)[0]
+
+
+def _read_model_state(refresh=False, lock=False):
+    global _model_state
+    name, coarse_dim, read_at = _model_state
+    if refresh or name is None or time.monotonic() - read_at > app.config["EMBEDDING_STATE_TTL"]:
+        query = (
+            select(EmbeddingModelState.active_model, EmbeddingModelState.target_model, EmbeddingModelState.coarse_dim)
+            .where(EmbeddingModelState.id == 1)
+        )
+        if lock:
+            query = query.with_for_update(read=True)
+        # Don't flush pending contact changes ahead of the lock
+        with db.session.no_autoflush:
+            state = db.session.execute(query).first()
+        name = state.active_model if state else app.config["EMBEDDING_MODEL"]
+        coarse_dim = state.coarse_dim if state else None
+        _model_state = (name, coarse_dim, time.monotonic())
+        if state and state.target_model and state.target_model not in _embedders:
+            threading.Thread(target=_preload, args=(state.target_model,), daemon=True).start()
+    return name, coarse_dim
+
+
+def _preload(model_name):
+    try:
+        get_embedder(model_name)
+    except Exception:
+        app.logger.exception("Could not preload embedding model %s", model_name)
+
+
+def get_embedder(model_name=None):
+    """The process-wide embedder for `model_name` (default: the active model), loaded on first use."""
+    model_name = model_name or active_model_name()
+    if model_name not in _embedders:
+        with _init_lock:
+            if model_name not in _embedders:
+                _embedders[model_name] = create_embedder(model_name=model_name)
+    return _embedders[model_name]
+
+
+def get_batcher(model_name=None):
+    """The process-wide micro-batcher in front of an embedder (EMBEDDING_BATCHING=true).
+
+    With threaded workers (gunicorn --worker-class gthread) concurrent requests would
+    otherwise each run their own forward pass and fight over the same cores.
+    """
+    model_name = model_name or active_model_name()
+    if model_name not in _batchers:
+        embedder = get_embedder(model_name)
+        with _init_lock:
+            if model_name not in _batchers:
+                _batchers[model_name] = MicroBatcher(
+                    lambda texts: embedder.encode(texts, batch_size=len(texts)),
+                    max_batch_size=app.config["EMBEDDING_BATCH_MAX_SIZE"],
+                    max_wait_ms=app.config["EMBEDDING_BATCH_MAX_WAIT_MS"],
+                    name=f"in-process:{model_name}",
+                )
+    return _batchers[model_name]
+
+
+def encode_one(text, model_name):
+    if app.config["EMBEDDING_BATCHING"]:
+        return get_batcher(model_name).submit(text).result()
+    return get_embedder(model_name).encode([text])[0]
+
+
+def build_profile_string(first_name, last_name, email, tags, notes):
+    tag_str = " ".join(tags) if tags else ""
+    return f"{first_name} {last_name} {email or ''} {tag_str} {notes or ''}"
+
+
+def generate_embedding(profile_string, model_name=None, for_write=False):
+    """Unit-length float32 embedding of one profile string.
+
+    Uses the active model unless `model_name` is given; returns an EmbeddingResult. The
+    vector is the embedder's own buffer, passed to pgvector as binary without copying.
+    With `for_write`, the model is read with lock_active_model() for storing the vector.
+    """
+    model_name = model_name or (lock_active_model() if for_write else active_model_name())
+    with phase("encode"):
+        embedding = encode_one(profile_string, model_name)
+    return EmbeddingResult(embedding, model_name)
+
+
+def generate_embeddings(profile_strings, model_name=None, for_write=False, embedder=None):
+    """Unit-length float32 embeddings, shape (n, dim), for many profile strings at once.
+
+    Same vectors as calling generate_embedding on each string, but encoded in batches,
+    in this process unless an `embedder` for `model_name` is passed: model process pools
+    (parallel_embedding.py) are for offline commands, not web workers. Returns an EmbeddingResult.
+    """
+    model_name = model_name or (lock_active_model() if for_write else active_model_name())
+    if not profile_strings:
+        return EmbeddingResult(np.empty((0, embedding_dimension(model_name)), dtype=np.float32), model_name)
+    with phase("encode"):
+        vectors = (embedder or get_embedder(model_name)).encode(list(profile_strings))
+    return EmbeddingResult(vectors, model_name)
@@ -0,0 +1,39 @@
+"""Gunicorn settings for the backend: `gunicorn -c gunicorn.conf.py main:app`."""
+import os
+import sys
+from cpu_tuning import apply_torch_threads, configure_blas_threads, cpu_slice, pin_to_cpus
+
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:5000")
+workers = int(os.environ.get("GUNICORN_WORKERS", 2))
+worker_class = os.environ.get("GUNICORN_WORKER_CLASS", "sync")
+threads = int(os.environ.get("GUNICORN_THREADS", 1))
+timeout = 120
+
+# Inherited by every worker, so numpy/torch pick it up when main.py is imported there
+configure_blas_threads(int(os.environ.get("TORCH_INTRA_OP_THREADS", 0)))
+
+# CPU_AFFINITY=per-worker gives each worker an even, disjoint share of the host's cores
+pin_workers = os.environ.get("CPU_AFFINITY", "").lower() == "per-worker"
+
+
+def pre_fork(server, worker):
+    # Runs in the master: hand out the lowest slot no live worker holds, so a
+    # restarted worker takes over the cores of the one it replaces.
+    used = {getattr(w, "cpu_slot", None) for w in server.WORKERS.values()}
+    worker.cpu_slot = next(slot for slot in range(len(used) + 1) if slot not in used)
+
+
+def post_fork(server, worker):
+    if not pin_workers:
+        return
+    cpus = cpu_slice(worker.cpu_slot, server.num_workers)
+    pin_to_cpus(cpus)
+    # Default torch's pool to the cores we own unless it was sized explicitly
+    if "torch" in sys.modules:
+        # --preload: the model was loaded in the master, so the env var would come too late.
+        # The BLAS caps below are too late for the preloaded numpy as well.
+        apply_torch_threads(int(os.environ.get("TORCH_INTRA_OP_THREADS", 0)) or len(cpus))
+    else:
+        os.environ.setdefault("TORCH_INTRA_OP_THREADS", str(len(cpus)))
+    configure_blas_threads(len(cpus))
+    server.log.info("Worker %s pinned to CPUs %s", worker.pid, cpus)
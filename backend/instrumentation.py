@@ -0,0 +1,184 @@
+"""Per-request latency broken down by phase, recorded into the metrics registry.
+
+Every request's wall time goes into http_request_duration_seconds. Within it, time spent
+encoding with the model, waiting on SQL, in pandas, and building the response body is
+recorded in http_request_phase_seconds (phases "encode", "db", "dataframe", "serialize";
+the remainder is "other"). That shows whether a slow endpoint is model-bound or
+database-bound.
+
+The same breakdown goes back on each response as a Server-Timing header (shown in the
+browser devtools' network panel) and, with REQUEST_LOG, as one JSON log line per request.
+"""
+import json
+import logging
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from flask import current_app, g, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+import metrics
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+REQUEST_SECONDS = metrics.histogram(
+    "http_request_duration_seconds", "Request latency by route, method and status", LATENCY_BUCKETS
+)
+PHASE_SECONDS = metrics.histogram(
+    "http_request_phase_seconds", "Time per request spent in each phase (encode, db, dataframe, serialize, other)",
+    LATENCY_BUCKETS,
+)
+DB_ROWS = metrics.counter("db_rows_fetched_total", "Rows returned to the app by SQL queries, by route")
+RESULTS = metrics.counter("search_results_returned_total", "Results returned by search endpoints, by route")
+
+_current = ContextVar("request_timer", default=None)
+
+request_log = logging.getLogger("findtact.requests")
+
+
+class RequestTimer:
+    def __init__(self, route, method):
+        self.route = route
+        self.method = method
+        self.started = time.perf_counter()
+        self.phases = defaultdict(float)
+        self.queries = 0
+
+    def add(self, phase, seconds):
+        self.phases[phase] += seconds
+
+    def finish(self, status):
+        """Record the request; returns (total seconds, {phase: seconds} including "other")."""
+        total = time.perf_counter() - self.started
+        phases = dict(self.phases)
+        phases["other"] = max(0.0, total - sum(phases.values()))
+        REQUEST_SECONDS.observe(total, route=self.route, method=self.method, status=str(status))
+        for phase, seconds in phases.items():
+            PHASE_SECONDS.observe(seconds, route=self.route, phase=phase)
+        return total, phases
+
+
+def server_timing(total, phases, queries=0):
+    """A Server-Timing header value: one entry per phase plus the total, in milliseconds."""
+    entries = []
+    for name, seconds in phases.items():
+        entry = f"{name};dur={seconds * 1000:.2f}"
+        if name == "db" and queries:
+            entry += f';desc="{queries} queries"'
+        entries.append(entry)
+    entries.append(f"total;dur={total * 1000:.2f}")
+    return ", ".join(entries)
+
+
+def log_request(timer, status, path, total, phases):
+    request_log.info(json.dumps({
+        "method": timer.method,
+        "route": timer.route,
+        "path": path,
+        "status": status,
+        "duration_ms": round(total * 1000, 2),
+        "phases_ms": {name: round(seconds * 1000, 2) for name, seconds in phases.items()},
+        "queries": timer.queries,
+    }))
+
+
+def record(timer, status, path, headers, config):
+    """Finish `timer`, then add the Server-Timing header and log line as configured."""
+    total, phases = timer.finish(status)
+    if config["SERVER_TIMING"]:
+        headers["Server-Timing"] = server_timing(total, phases, timer.queries)
+    if config["REQUEST_LOG"]:
+        log_request(timer, status, path, total, phases)
+
+
+def start_request(route, method):
+    """Begin timing a request in the current context; pass the token to end_request."""
+    return _current.set(RequestTimer(route, method))
+
+
+def end_request(token):
+    _current.reset(token)
+
+
+def current_timer():
+    return _current.get()
+
+
+@contextmanager
+def phase(name):
+    """Attribute the enclosed time to `name` in the current request (no-op outside one)."""
+    timer = _current.get()
+    if timer is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timer.add(name, time.perf_counter() - start)
+
+
+def count_query(rows):
+    """Record one query returning `rows` rows (for queries that bypass the SQLAlchemy engine)."""
+    timer = _current.get()
+    if timer is not None:
+        timer.queries += 1
+    if rows:
+        DB_ROWS.inc(rows, route=timer.route if timer else "none")
+
+
+def count_results(n):
+    timer = _current.get()
+    RESULTS.inc(n, route=timer.route if timer else "none")
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _query_started(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _query_finished(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info["query_started"].pop()
+    timer = _current.get()
+    if timer is None:
+        return
+    timer.add("db", time.perf_counter() - started)
+    count_query(cursor.rowcount if cursor.description is not None and cursor.rowcount > 0 else 0)
+
+
+@event.listens_for(Engine, "handle_error")
+def _query_failed(context):
+    if context.connection is not None and context.connection.info.get("query_started"):
+        context.connection.info["query_started"].pop()
+
+
+def _before_request():
+    route = request.url_rule.rule if request.url_rule else "unmatched"
+    g.request_timer_token = start_request(route, request.method)
+
+
+def _after_request(response):
+    timer = _current.get()
+    if timer is not None:
+        record(timer, response.status_code, request.path, response.headers, current_app.config)
+    return response
+
+
+def _teardown_request(exc):
+    token = g.pop("request_timer_token", None)
+    if token is not None:
+        end_request(token)
+
+
+def init_app(app):
+    if app.config["REQUEST_LOG"] and not request_log.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        request_log.addHandler(handler)
+        request_log.setLevel(logging.INFO)
+        request_log.propagate = False
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.teardown_request(_teardown_request)
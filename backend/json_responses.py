@@ -0,0 +1,103 @@
+"""Faster JSON encoding, and JSON responses streamed straight from a DB cursor.
+
+OrjsonProvider swaps Flask's JSON provider (jsonify, request.get_json, and asgi.py's
+json_response) onto orjson, keeping DefaultJSONProvider's output: sorted keys, dates as
+HTTP dates. Non-ASCII text is sent as UTF-8 rather than \\u escapes, and NaN as null.
+
+stream_object, stream_array and stream_lines (NDJSON) write a large result as it is read,
+BATCH_ROWS elements at a time, so the first bytes leave before the last row is fetched and
+the full list is never held in memory. Server-Timing and the request log cover the work done before the
+body starts; the rows fetched while streaming are not in them.
+"""
+import itertools
+from flask import Response, current_app, stream_with_context
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # optional: Flask's stdlib encoder is used without it
+    orjson = None
+
+# Rows per server-side cursor fetch, and elements per chunk written to the client
+BATCH_ROWS = 500
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """DefaultJSONProvider with orjson doing the encoding and decoding."""
+
+    def _options(self, indent=None):
+        # Datetimes go through Flask's default (HTTP dates), like the stdlib provider
+        options = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+        if self.sort_keys:
+            options |= orjson.OPT_SORT_KEYS
+        if indent:
+            options |= orjson.OPT_INDENT_2
+        return options
+
+    def dumps(self, obj, **kwargs):
+        # Separators and ensure_ascii don't apply: orjson output is always compact UTF-8
+        return self.dump_bytes(obj, indent=kwargs.get("indent")).decode()
+
+    def dump_bytes(self, obj, indent=None):
+        return orjson.dumps(obj, default=self.default, option=self._options(indent))
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = (self.compact is None and self._app.debug) or self.compact is False
+        return self._app.response_class(self.dump_bytes(obj, indent=indent) + b"\n", mimetype=self.mimetype)
+
+
+def init_app(app):
+    if app.config["JSON_BACKEND"] == "orjson":
+        if orjson is None:
+            app.logger.warning("JSON_BACKEND=orjson but orjson is not installed; using the stdlib encoder")
+        else:
+            app.json = OrjsonProvider(app)
+
+
+def _batches(items):
+    items = iter(items)
+    while batch := list(itertools.islice(items, BATCH_ROWS)):
+        yield batch
+
+
+def stream_array(items):
+    """Text chunks of a JSON array of `items`, BATCH_ROWS elements per chunk."""
+    dumps = current_app.json.dumps
+    separator = "["
+    for batch in _batches(items):
+        yield separator + ",".join(dumps(item) for item in batch)
+        separator = ","
+    yield "[]" if separator == "[" else "]"
+
+
+def stream_lines(items):
+    """Text chunks of newline-delimited JSON, one line per element of `items`."""
+    dumps = current_app.json.dumps
+    for batch in _batches(items):
+        yield "".join(dumps(item) + "\n" for item in batch)
+
+
+def stream_object(fields, key, items):
+    """Text chunks of a JSON object: `fields`, plus `key` holding a streamed array of `items`.
+
+    With the provider's sort_keys (Flask's default) `key` is written at its sorted position,
+    so the keys come in the same order as in a buffered jsonify response; otherwise it is last.
+    """
+    dumps = current_app.json.dumps
+    if current_app.json.sort_keys:
+        before = {name: value for name, value in fields.items() if name < key}
+        after = {name: value for name, value in fields.items() if name > key}
+    else:
+        before, after = fields, {}
+    yield dumps(before)[:-1] + ("," if before else "") + dumps(key) + ":"  # without the closing brace
+    yield from stream_array(items)
+    yield ("," + dumps(after)[1:] if after else "}") + "\n"  # without the opening brace
+
+
+def streamed_response(chunks, mimetype="application/json", **kwargs):
+    # The request context (and its DB session) stays open until the last chunk is sent
+    return Response(stream_with_context(chunks), mimetype=mimetype, **kwargs)
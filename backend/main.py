@@ -1,52 +1,56 @@
-from flask import request, jsonify, Response
+from flask import request, jsonify, Response, send_file, send_from_directory
 from config import app, db
-from models import Contact
+from models import Contact, ensure_columns
+from search import search_contacts, similar_candidate_ids
+from embeddings import (
+    active_model_name, build_profile_string, generate_embedding, get_batcher, get_embedder
+)
+from db_pool import pool_stats
+from db_routing import read_only
+from instrumentation import count_query, count_results, phase
+from admin import admin_required
+from json_responses import BATCH_ROWS, stream_array, stream_lines, stream_object, streamed_response
+from model_registry import embedding_dimension
+from contact_import import MissingColumns, read_contacts_csv, write_contacts
+import parquet_export
+import query_sampling
+import profiler
+import os
+from metrics import render_prometheus
+import commands  # noqa: F401  (registers `flask --app main ...` CLI commands)
 import re
+import math
 import datetime
-from sentence_transformers import SentenceTransformer
 from sqlalchemy import text
+from sqlalchemy.orm import defer
 import numpy as np
 import pandas as pd
 from io import StringIO
 
-# Load the model once at startup
-embedding_model = SentenceTransformer("all-MiniLM-L6-v2")  # 384-dim vectors
-
 
 @app.route("/contacts", methods=["GET"])
+@read_only
 def get_contacts():
     # Get pagination parameters from query string, with defaults
     page = request.args.get("page", 1, type=int)
     per_page = request.args.get("per_page", 10, type=int)
+    if per_page >= app.config["STREAM_JSON_MIN_ROWS"]:
+        return stream_contacts_page(page, per_page)
 
     # Use SQLAlchemy's paginate method (Flask-SQLAlchemy >=3.0)
-    pagination = Contact.query.paginate(page=page, per_page=per_page, error_out=False)
+    # Ordered by id like the streamed and ASGI pages, so every path returns the same rows
+    pagination = Contact.query.order_by(Contact.id).paginate(page=page, per_page=per_page, error_out=False)
     contacts = pagination.items
-    json_contacts = list(map(lambda x: x.to_json(), contacts))
-
-    return jsonify({
-        "contacts": json_contacts,
-        "total": pagination.total,
-        "page": pagination.page,
-        "per_page": pagination.per_page,
-        "pages": pagination.pages
-    })
-
+    with phase("serialize"):
+        json_contacts = list(map(lambda x: x.to_json(), contacts))
 
-def build_profile_string(first_name, last_name, email, tags, notes):
-    tag_str = " ".join(tags) if tags else ""
-    return f"{first_name} {last_name} {email or ''} {tag_str} {notes or ''}"
-
-
-def generate_embedding(profile_string):
-    """Generate a normalized embedding using numpy for vector operations."""
-    embedding = embedding_model.encode(profile_string)
-    # Use numpy to normalize the embedding vector (unit length for cosine similarity)
-    embedding_np = np.array(embedding)
-    norm = np.linalg.norm(embedding_np)
-    if norm > 0:
-        embedding_np = embedding_np / norm
-    return embedding_np.tolist(), "all-MiniLM-L6-v2"
+        return jsonify({
+            "contacts": json_contacts,
+            "total": pagination.total,
+            "page": pagination.page,
+            "per_page": pagination.per_page,
+            "pages": pagination.pages
+        })
 
 
 @app.route("/create_contact", methods=["POST"])
@@ -68,7 +72,7 @@ def create_contact():
         return jsonify({"message": "Invalid email format."}), 400
 
     profile_string = build_profile_string(first_name, last_name, email, tags, notes)
-    embedding, embedding_model = generate_embedding(profile_string)
+    embedding, embedding_model = generate_embedding(profile_string, for_write=True)
     embedded_at = datetime.datetime.now(datetime.UTC)
 
     new_contact = Contact(
@@ -117,7 +121,7 @@ def update_contact(user_id):
     contact.tags = data.get("tags", contact.tags)
     contact.notes = data.get("notes", contact.notes)
     contact.search_text = build_profile_string(contact.first_name, contact.last_name, contact.email, contact.tags, contact.notes)
-    contact.embedding, contact.embedding_model = generate_embedding(contact.search_text)
+    contact.embedding, contact.embedding_model = generate_embedding(contact.search_text, for_write=True)
     contact.embedded_at = datetime.datetime.now(datetime.UTC)
     db.session.commit()
 
@@ -146,6 +150,27 @@ def health_db():
     return jsonify({"database": meta["db"], "user": meta["user"], "contact_count": count})
 
 
+@app.route("/health/pool", methods=["GET"])
+def health_pool():
+    """Connection pool usage for this worker: connections in use, overflow and checkout wait times."""
+    stats = pool_stats(db.engine.pool)
+    if app.config["DATABASE_REPLICA_BINDS"]:
+        stats["replicas"] = {key: pool_stats(db.engines[key].pool) for key in app.config["DATABASE_REPLICA_BINDS"]}
+    return jsonify(stats)
+
+
+@app.route("/health/embedding", methods=["GET"])
+def health_embedding():
+    """Embedding backend and active model and, when batching is on, the batch size distribution."""
+    embedder = get_embedder()
+    return jsonify({
+        "backend": app.config["EMBEDDER_BACKEND"],
+        "model": embedder.model_name,
+        "dimension": embedder.dimension,
+        "batching": get_batcher().stats() if app.config["EMBEDDING_BATCHING"] else None,
+    })
+
+
 @app.errorhandler(Exception)
 def handle_unexpected_error(err):
     # Ensure we return JSON on unexpected errors (makes frontend debugging easier).
@@ -154,6 +179,63 @@ def handle_unexpected_error(err):
     return jsonify({"message": str(err)}), 500
 
 
+@app.route("/metrics", methods=["GET"])
+def prometheus_metrics():
+    """Request latency, phase timings, pool and embedding metrics in Prometheus text format (this worker only)."""
+    return Response(render_prometheus(), mimetype="text/plain; version=0.0.4")
+
+
+@app.route("/admin/slow_queries", methods=["GET"])
+@admin_required
+def slow_queries():
+    """Plans of recent slow sampled search queries, newest first (this worker only). DELETE clears them."""
+    return jsonify({
+        "sample_rate": app.config["QUERY_SAMPLE_RATE"],
+        "threshold_ms": app.config["SLOW_QUERY_MS"],
+        "queries": query_sampling.captured_plans(),
+    })
+
+
+@app.route("/admin/slow_queries", methods=["DELETE"])
+@admin_required
+def clear_slow_queries():
+    query_sampling.clear()
+    return jsonify({"message": "Cleared."}), 200
+
+
+@app.route("/admin/profile", methods=["POST"])
+@admin_required
+def start_profile():
+    """Start sampling this worker's stacks in the background; fetch the result from /admin/profiles/<name>."""
+    seconds = request.args.get("seconds", 30, type=float)
+    hz = request.args.get("hz", 100, type=float)
+    include_idle = request.args.get("idle", "false").lower() == "true"
+    if not 0 < seconds <= app.config["PROFILE_MAX_SECONDS"]:
+        return jsonify({"message": f"seconds must be between 0 and {app.config['PROFILE_MAX_SECONDS']}."}), 400
+    if not 0 < hz <= 1000:
+        return jsonify({"message": "hz must be between 0 and 1000."}), 400
+
+    name = profiler.start(app.config["PROFILE_DIR"], seconds, 1 / hz, include_idle)
+    if name is None:
+        return jsonify({"message": "A profile is already running in this worker."}), 409
+    return jsonify({"name": name, "pid": os.getpid(), "seconds": seconds, "hz": hz}), 202
+
+
+@app.route("/admin/profiles", methods=["GET"])
+@admin_required
+def list_profiles():
+    return jsonify({"profiles": profiler.list_profiles(app.config["PROFILE_DIR"])})
+
+
+@app.route("/admin/profiles/<name>", methods=["GET"])
+@admin_required
+def get_profile(name):
+    """A finished profile in collapsed-stack format (404 while it is still running)."""
+    if name not in profiler.list_profiles(app.config["PROFILE_DIR"]):
+        return jsonify({"message": "No such profile (it may still be running)."}), 404
+    return send_from_directory(app.config["PROFILE_DIR"], name, mimetype="text/plain", as_attachment=True)
+
+
 @app.route("/semantic_search", methods=["OPTIONS"])
 def semantic_search_options():
     # Explicit preflight response. Flask-CORS usually handles this, but some setups
@@ -162,6 +244,8 @@ def semantic_search_options():
 
 
 @app.route("/semantic_search", methods=["POST"])
+@read_only
+@query_sampling.sample_queries
 def semantic_search():
     app.logger.info("/semantic_search Origin=%s", request.headers.get("Origin"))
     data = request.get_json() or {}
@@ -176,50 +260,32 @@ def semantic_search():
     if not query or not str(query).strip():
         return jsonify({"message": "Query is required."}), 400
 
-    query_embedding, _ = generate_embedding(query)
-
-    # Send as pgvector text literal to avoid psycopg2 treating it as numeric[]
-    query_embedding_literal = "[" + ",".join(map(str, query_embedding)) + "]"
-
-    sql = text('''
-        SELECT
-            id,
-            first_name,
-            last_name,
-            email,
-            tags,
-            notes,
-            search_text,
-            embedding_model,
-            embedded_at,
-            (1 - (embedding <=> CAST(:query_embedding AS vector))) AS similarity
-        FROM public.contact
-        WHERE embedding IS NOT NULL
-        ORDER BY embedding <=> CAST(:query_embedding AS vector)
-        LIMIT :limit
-    ''')
-
-    rows = db.session.execute(
-        sql,
-        {"query_embedding": query_embedding_literal, "limit": limit}
-    ).mappings().all()
-
-    results = []
-    for r in rows:
-        results.append({
-            "id": r["id"],
-            "firstName": r["first_name"],
-            "lastName": r["last_name"],
-            "email": r["email"],
-            "tags": r["tags"],
-            "notes": r["notes"],
-            "search_text": r["search_text"],
-            "embedding_model": r["embedding_model"],
-            "embedded_at": r["embedded_at"],
-            "similarity": float(r["similarity"]) if r["similarity"] is not None else None,
-        })
-
-    return jsonify({"results": results})
+    # The float32 array is bound directly; pgvector's psycopg adapter sends it in binary
+    query_embedding, model_name = generate_embedding(query)
+    rows = search_contacts(query_embedding, limit, model_name)
+    if not rows and active_model_name(refresh=True) != model_name:
+        # A model cutover landed inside this worker's state TTL; retry with the new model
+        query_embedding, model_name = generate_embedding(query)
+        rows = search_contacts(query_embedding, limit, model_name)
+
+    count_results(len(rows))
+    with phase("serialize"):
+        results = []
+        for r in rows:
+            results.append({
+                "id": r["id"],
+                "firstName": r["first_name"],
+                "lastName": r["last_name"],
+                "email": r["email"],
+                "tags": r["tags"],
+                "notes": r["notes"],
+                "search_text": r["search_text"],
+                "embedding_model": r["embedding_model"],
+                "embedded_at": r["embedded_at"],
+                "similarity": float(r["similarity"]) if r["similarity"] is not None else None,
+            })
+
+        return jsonify({"results": results})
 
 
 @app.route("/seed_contacts", methods=["POST"])
@@ -282,7 +348,7 @@ def seed_contacts():
             c.get("tags"),
             c.get("notes"),
         )
-        embedding, embedding_model_name = generate_embedding(profile_string)
+        embedding, embedding_model_name = generate_embedding(profile_string, for_write=True)
 
         new_contact = Contact(
             first_name=c["firstName"],
@@ -310,9 +376,72 @@ def seed_contacts():
 
 # ===================== PANDAS-POWERED ENDPOINTS =====================
 
+def streamed_contacts(query):
+    """`query`'s contacts read through a server-side cursor, without their vectors."""
+    return query.options(defer(Contact.embedding), defer(Contact.embedding_coarse)).yield_per(BATCH_ROWS)
+
+
+def stream_contacts_page(page, per_page):
+    # Same envelope and page arithmetic as paginate(error_out=False), written as rows arrive
+    page = max(page, 1)
+    total = Contact.query.order_by(None).count()
+    contacts = streamed_contacts(Contact.query.order_by(Contact.id).limit(per_page).offset((page - 1) * per_page))
+    return streamed_response(stream_object(
+        {"total": total, "page": page, "per_page": per_page, "pages": math.ceil(total / per_page) if total else 0},
+        "contacts", (c.to_json() for c in contacts),
+    ))
+
+
+EXPORT_FORMATS = ("csv", "json", "ndjson", "parquet")
+
+
+def export_record(c):
+    return {
+        "id": c.id,
+        "first_name": c.first_name,
+        "last_name": c.last_name,
+        "email": c.email,
+        "tags": c.tags or [],
+        "notes": c.notes or "",
+        "created_at": c.embedded_at
+    }
+
+
 @app.route("/export_contacts", methods=["GET"])
+@read_only
 def export_contacts():
-    """Export all contacts to CSV using pandas DataFrame."""
+    """Export all contacts: CSV (via a pandas DataFrame) by default, or ?format=json|ndjson|parquet.
+
+    JSON and NDJSON are streamed as rows are read. Parquet is columnar and compressed, and
+    with ?embedding=true carries each contact's vector as a fixed-size float32 list.
+    """
+    export_format = request.args.get("format", "csv")
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({"message": f"format must be one of {', '.join(EXPORT_FORMATS)}."}), 400
+
+    if export_format != "csv":
+        if export_format == "parquet" and not parquet_export.available():
+            return jsonify({"message": "format=parquet needs the pyarrow package."}), 501
+        if not db.session.query(Contact.query.exists()).scalar():
+            return jsonify({"message": "No contacts to export."}), 404
+        disposition = {"Content-Disposition": f"attachment;filename=contacts_export.{export_format}"}
+
+    if export_format == "parquet":
+        with_embedding = request.args.get("embedding", "false").lower() == "true"
+        dimension = embedding_dimension(active_model_name()) if with_embedding else None
+        dbapi_connection = db.session.connection().connection.driver_connection
+        with phase("serialize"):
+            parquet_file, rows = parquet_export.write_parquet(dbapi_connection, dimension)
+        count_query(rows)
+        return send_file(parquet_file, mimetype="application/vnd.apache.parquet", max_age=0,
+                         as_attachment=True, download_name="contacts_export.parquet")
+
+    if export_format in ("json", "ndjson"):
+        records = (export_record(c) for c in streamed_contacts(Contact.query.order_by(Contact.id)))
+        if export_format == "ndjson":
+            return streamed_response(stream_lines(records), mimetype="application/x-ndjson", headers=disposition)
+        return streamed_response(stream_array(records), headers=disposition)
+
     contacts = Contact.query.all()
 
     if not contacts:
@@ -321,22 +450,18 @@ def export_contacts():
     # Convert contacts to pandas DataFrame
     data = []
     for c in contacts:
-        data.append({
-            "id": c.id,
-            "first_name": c.first_name,
-            "last_name": c.last_name,
-            "email": c.email,
-            "tags": ";".join(c.tags) if c.tags else "",  # Join tags with semicolon
-            "notes": c.notes or "",
-            "created_at": c.embedded_at
-        })
+        record = export_record(c)
+        record["tags"] = ";".join(record["tags"])  # Join tags with semicolon
+        data.append(record)
 
-    df = pd.DataFrame(data)
+    with phase("dataframe"):
+        df = pd.DataFrame(data)
 
-    # Convert to CSV string
-    csv_buffer = StringIO()
-    df.to_csv(csv_buffer, index=False)
-    csv_content = csv_buffer.getvalue()
+    with phase("serialize"):
+        # Convert to CSV string
+        csv_buffer = StringIO()
+        df.to_csv(csv_buffer, index=False)
+        csv_content = csv_buffer.getvalue()
 
     return Response(
         csv_content,
@@ -356,75 +481,25 @@ def import_contacts():
         return jsonify({"message": "No file selected."}), 400
 
     try:
-        # Read CSV into pandas DataFrame
-        df = pd.read_csv(file)
-
-        # Validate required columns
-        required_cols = ["first_name", "last_name", "email"]
-        missing_cols = [col for col in required_cols if col not in df.columns]
-        if missing_cols:
-            return jsonify({"message": f"Missing required columns: {missing_cols}"}), 400
-
-        # Clean data using pandas
-        df = df.fillna("")  # Replace NaN with empty strings
-        df["first_name"] = df["first_name"].astype(str).str.strip()
-        df["last_name"] = df["last_name"].astype(str).str.strip()
-        df["email"] = df["email"].astype(str).str.strip().str.lower()
-
-        created = 0
-        skipped = 0
-        errors = []
-
-        for idx, row in df.iterrows():
-            # Skip if email already exists
-            if Contact.query.filter_by(email=row["email"]).first():
-                skipped += 1
-                continue
-
-            # Parse tags from semicolon-separated string
-            tags = []
-            if "tags" in row and row["tags"]:
-                tags = [t.strip() for t in str(row["tags"]).split(";") if t.strip()]
-
-            notes = row.get("notes", "") if "notes" in df.columns else ""
-
-            profile_string = build_profile_string(
-                row["first_name"],
-                row["last_name"],
-                row["email"],
-                tags,
-                notes
-            )
-            embedding, embedding_model_name = generate_embedding(profile_string)
-
-            new_contact = Contact(
-                first_name=row["first_name"],
-                last_name=row["last_name"],
-                email=row["email"],
-                tags=tags if tags else None,
-                notes=notes if notes else None,
-                search_text=profile_string,
-                embedding=embedding,
-                embedding_model=embedding_model_name,
-                embedded_at=datetime.datetime.now(datetime.UTC),
-            )
-            db.session.add(new_contact)
-            created += 1
-
+        new_rows, skipped, total_rows = read_contacts_csv(file)
+        created = write_contacts(new_rows)
         db.session.commit()
 
         return jsonify({
             "message": "Import complete.",
             "created": created,
             "skipped": skipped,
-            "total_rows": len(df)
+            "total_rows": total_rows
         }), 200
 
+    except MissingColumns as e:
+        return jsonify({"message": str(e)}), 400
     except Exception as e:
         return jsonify({"message": f"Error processing CSV: {str(e)}"}), 400
 
 
 @app.route("/contacts/analytics", methods=["GET"])
+@read_only
 def contacts_analytics():
     """Get analytics about contacts using pandas and numpy."""
     contacts = Contact.query.all()
@@ -447,57 +522,63 @@ def contacts_analytics():
             "tag_count": len(c.tags) if c.tags else 0,
             "embedded_at": c.embedded_at
         })
-        if c.embedding:
+        if c.embedding is not None:
             embeddings.append(c.embedding)
 
-    df = pd.DataFrame(data)
-
-    # Tag frequency analysis using pandas
-    all_tags = []
-    for tags in df["tags"]:
-        all_tags.extend(tags)
-    tag_series = pd.Series(all_tags)
-    tag_counts = tag_series.value_counts().to_dict() if all_tags else {}
-
-    # Notes statistics using pandas/numpy
-    notes_stats = {
-        "avg_length": float(df["notes_length"].mean()),
-        "max_length": int(df["notes_length"].max()),
-        "min_length": int(df["notes_length"].min()),
-        "contacts_with_notes": int((df["notes_length"] > 0).sum())
-    }
-
-    # Tag statistics
-    tag_stats = {
-        "avg_tags_per_contact": float(df["tag_count"].mean()),
-        "max_tags": int(df["tag_count"].max()),
-        "contacts_with_tags": int((df["tag_count"] > 0).sum()),
-        "unique_tags": len(tag_counts),
-        "top_tags": dict(list(tag_counts.items())[:10])  # Top 10 tags
-    }
+    with phase("dataframe"):
+        df = pd.DataFrame(data)
+
+        # Tag frequency analysis using pandas
+        all_tags = []
+        for tags in df["tags"]:
+            all_tags.extend(tags)
+        tag_series = pd.Series(all_tags)
+        tag_counts = tag_series.value_counts().to_dict() if all_tags else {}
+
+        # Notes statistics using pandas/numpy
+        notes_stats = {
+            "avg_length": float(df["notes_length"].mean()),
+            "max_length": int(df["notes_length"].max()),
+            "min_length": int(df["notes_length"].min()),
+            "contacts_with_notes": int((df["notes_length"] > 0).sum())
+        }
 
-    # Embedding analysis using numpy (if embeddings exist)
-    embedding_stats = {}
-    if embeddings:
-        embeddings_np = np.array(embeddings)
-        # Calculate average embedding magnitude
-        magnitudes = np.linalg.norm(embeddings_np, axis=1)
-        embedding_stats = {
-            "total_embedded": len(embeddings),
-            "avg_magnitude": float(np.mean(magnitudes)),
-            "embedding_dimension": embeddings_np.shape[1]
+        # Tag statistics
+        tag_stats = {
+            "avg_tags_per_contact": float(df["tag_count"].mean()),
+            "max_tags": int(df["tag_count"].max()),
+            "contacts_with_tags": int((df["tag_count"] > 0).sum()),
+            "unique_tags": len(tag_counts),
+            "top_tags": dict(list(tag_counts.items())[:10])  # Top 10 tags
         }
 
-    return jsonify({
-        "total_contacts": len(contacts),
-        "notes_stats": notes_stats,
-        "tag_stats": tag_stats,
-        "embedding_stats": embedding_stats,
-        "email_domains": df["email"].str.split("@").str[1].value_counts().to_dict()
-    })
+        # Embedding analysis using numpy (if embeddings exist)
+        embedding_stats = {}
+        if embeddings:
+            embeddings_np = np.array(embeddings)
+            # Calculate average embedding magnitude
+            magnitudes = np.linalg.norm(embeddings_np, axis=1)
+            embedding_stats = {
+                "total_embedded": len(embeddings),
+                "avg_magnitude": float(np.mean(magnitudes)),
+                "embedding_dimension": embeddings_np.shape[1]
+            }
+
+        email_domains = df["email"].str.split("@").str[1].value_counts().to_dict()
+
+    with phase("serialize"):
+        return jsonify({
+            "total_contacts": len(contacts),
+            "notes_stats": notes_stats,
+            "tag_stats": tag_stats,
+            "embedding_stats": embedding_stats,
+            "email_domains": email_domains
+        })
 
 
 @app.route("/contacts/similar/<int:contact_id>", methods=["GET"])
+@read_only
+@query_sampling.sample_queries
 def find_similar_contacts(contact_id):
     """Find contacts similar to a given contact using numpy cosine similarity."""
     contact = Contact.query.get(contact_id)
@@ -505,46 +586,51 @@ def find_similar_contacts(contact_id):
     if not contact:
         return jsonify({"message": "Contact not found."}), 404
 
-    if not contact.embedding:
+    if contact.embedding is None:
         return jsonify({"message": "Contact has no embedding."}), 400
 
     limit = request.args.get("limit", 5, type=int)
     limit = max(1, min(limit, 20))
 
-    # Get all other contacts with embeddings
+    # Get all other contacts with embeddings from the same model (or only the coarse-index
+    # candidates, if enabled)
     other_contacts = Contact.query.filter(
         Contact.id != contact_id,
-        Contact.embedding.isnot(None)
-    ).all()
+        Contact.embedding.isnot(None),
+        Contact.embedding_model == contact.embedding_model
+    )
+    candidate_ids = similar_candidate_ids(contact.embedding, contact.embedding_model, contact_id, limit)
+    if candidate_ids is not None:
+        other_contacts = other_contacts.filter(Contact.id.in_(candidate_ids))
+    other_contacts = other_contacts.all()
 
     if not other_contacts:
         return jsonify({"results": [], "message": "No other contacts to compare."})
 
-    # Use numpy for efficient similarity calculation
-    target_embedding = np.array(contact.embedding)
-
-    similarities = []
-    for c in other_contacts:
-        other_embedding = np.array(c.embedding)
-        # Cosine similarity using numpy dot product (embeddings are normalized)
-        similarity = float(np.dot(target_embedding, other_embedding))
-        similarities.append({
-            "contact": c.to_json(),
-            "similarity": similarity
+    # One float32 matrix-vector product over all candidates; the stored embeddings are
+    # unit length, so the dot product is the cosine similarity
+    target_embedding = np.asarray(contact.embedding, dtype=np.float32)
+    matrix = np.stack([np.asarray(c.embedding, dtype=np.float32) for c in other_contacts])
+    scores = matrix @ target_embedding
+    # Stable, so equal scores keep query order; only the top `limit` are serialized
+    top = np.argsort(-scores, kind="stable")[:limit]
+    similarities = [{"contact": other_contacts[i].to_json(), "similarity": float(scores[i])} for i in top]
+    count_results(len(similarities))
+
+    with phase("serialize"):
+        return jsonify({
+            "source_contact": contact.to_json(),
+            "similar_contacts": similarities
         })
 
-    # Sort by similarity (descending) using numpy-style sorting
-    similarities.sort(key=lambda x: x["similarity"], reverse=True)
-
-    return jsonify({
-        "source_contact": contact.to_json(),
-        "similar_contacts": similarities[:limit]
-    })
-
 
 # Create database tables on startup (works with both direct run and gunicorn)
 with app.app_context():
     db.create_all()
+    ensure_columns()
+
+    # Load the model once at startup (backend chosen by EMBEDDER_BACKEND)
+    get_embedder()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,120 @@
+"""In-process counters and histograms.
+
+Values live in the current worker process only; each gunicorn worker reports its own.
+"""
+import bisect
+import threading
+
+REGISTRY = {}
+_registry_lock = threading.Lock()
+
+
+def _key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(pairs):
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _header(metric, kind):
+    help_text = metric.help.replace("\\", "\\\\").replace("\n", "\\n")
+    return [f"# HELP {metric.name} {help_text}", f"# TYPE {metric.name} {kind}"]
+
+
+class Counter:
+    def __init__(self, name, help):
+        self.name = name
+        self.help = help
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def inc(self, amount=1, **labels):
+        key = _key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def to_json(self):
+        with self._lock:
+            return [{"labels": dict(key), "value": value} for key, value in self._values.items()]
+
+    def to_prometheus(self):
+        with self._lock:
+            values = list(self._values.items())
+        return _header(self, "counter") + [f"{self.name}{_labels(key)} {value}" for key, value in values]
+
+
+class Histogram:
+    def __init__(self, name, help, buckets):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        self._series = {}  # label key -> [per-bucket counts (last is +Inf), sum, count]
+
+    def observe(self, value, **labels):
+        key = _key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][bisect.bisect_left(self.buckets, value)] += 1
+            series[1] += value
+            series[2] += 1
+
+    def to_json(self):
+        """Cumulative [upper bound, count] pairs per label set, Prometheus-style."""
+        with self._lock:
+            series = [(dict(key), list(counts), total, count) for key, (counts, total, count) in self._series.items()]
+        out = []
+        for labels, counts, total, count in series:
+            cumulative, running = [], 0
+            for bound, n in zip(list(self.buckets) + ["+Inf"], counts):
+                running += n
+                cumulative.append([bound, running])
+            out.append({"labels": labels, "buckets": cumulative, "sum": total, "count": count})
+        return out
+
+    def to_prometheus(self):
+        lines = _header(self, "histogram")
+        for series in self.to_json():
+            key = tuple(sorted(series["labels"].items()))
+            for bound, count in series["buckets"]:
+                lines.append(f"{self.name}_bucket{_labels(key + (('le', bound),))} {count}")
+            lines.append(f"{self.name}_sum{_labels(key)} {series['sum']}")
+            lines.append(f"{self.name}_count{_labels(key)} {series['count']}")
+        return lines
+
+
+def _register(cls, name, *args):
+    with _registry_lock:
+        metric = REGISTRY.get(name)
+        if metric is None:
+            metric = REGISTRY[name] = cls(name, *args)
+        return metric
+
+
+def counter(name, help):
+    """Get or create the counter called `name`."""
+    return _register(Counter, name, help)
+
+
+def histogram(name, help, buckets):
+    """Get or create the histogram called `name`."""
+    return _register(Histogram, name, help, buckets)
+
+
+def render_prometheus():
+    """Every registered metric in the Prometheus text exposition format (version 0.0.4)."""
+    with _registry_lock:
+        registered = list(REGISTRY.values())
+    lines = []
+    for metric in registered:
+        lines.extend(metric.to_prometheus())
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,191 @@
+"""Zero-downtime switch to a different embedding model.
+
+1. `flask embedding-model reembed --target NAME` records NAME as the target model and
+   fills `contact_embedding_shadow` with NAME's vectors in throttled batches. Searches
+   keep using the live column meanwhile. Rows written during the run are picked up
+   again, because each shadow row remembers the `embedded_at` it was built from.
+2. `flask embedding-model cutover` locks out writers, re-embeds any stragglers, copies
+   the shadow vectors into `contact.embedding` and flips the active model in one
+   transaction. Workers notice within EMBEDDING_STATE_TTL seconds.
+
+Each step locks the state row, so concurrent runs take turns. Writers lock it FOR SHARE
+before writing vectors (embeddings.lock_active_model), so none can store an old model's
+vector once the cutover has committed.
+"""
+import datetime
+import time
+from flask import current_app
+from sqlalchemy import text
+from sqlalchemy.dialects.postgresql import insert
+from config import db
+from embeddings import build_profile_string, create_embedder, get_embedder
+from model_registry import embedding_dimension
+from models import EmbeddingModelState, coarse_embedding
+
+PENDING_SQL = '''
+    SELECT c.id, c.first_name, c.last_name, c.email, c.tags, c.notes, c.embedded_at
+    FROM public.contact c
+    LEFT JOIN public.contact_embedding_shadow s
+        ON s.contact_id = c.id AND s.embedding_model = :target
+    WHERE (s.contact_id IS NULL OR s.source_embedded_at IS DISTINCT FROM c.embedded_at)
+      AND c.id > :after
+    ORDER BY c.id
+    LIMIT :batch_size
+'''
+
+UPSERT_SHADOW_SQL = text('''
+    INSERT INTO public.contact_embedding_shadow
+        (contact_id, embedding_model, embedding, embedding_coarse, source_embedded_at)
+    VALUES (:contact_id, :embedding_model, :embedding, :embedding_coarse, :source_embedded_at)
+    ON CONFLICT (contact_id) DO UPDATE SET
+        embedding_model = EXCLUDED.embedding_model,
+        embedding = EXCLUDED.embedding,
+        embedding_coarse = EXCLUDED.embedding_coarse,
+        source_embedded_at = EXCLUDED.source_embedded_at
+''')
+
+
+def get_state(for_update=False):
+    """The embedding_model_state row, created from EMBEDDING_MODEL on first use.
+
+    With `for_update` the row stays locked until the transaction ends.
+    """
+    state = db.session.get(EmbeddingModelState, 1, with_for_update=for_update)
+    if state is None:
+        db.session.execute(
+            insert(EmbeddingModelState)
+            .values(id=1, active_model=current_app.config["EMBEDDING_MODEL"])
+            .on_conflict_do_nothing()
+        )
+        state = db.session.get(EmbeddingModelState, 1, with_for_update=for_update)
+    return state
+
+
+def coverage(target):
+    """(rows with an up-to-date shadow vector for `target`, total rows)."""
+    row = db.session.execute(text('''
+        SELECT
+            COUNT(s.contact_id) FILTER (WHERE s.source_embedded_at IS NOT DISTINCT FROM c.embedded_at) AS done,
+            COUNT(*) AS total
+        FROM public.contact c
+        LEFT JOIN public.contact_embedding_shadow s
+            ON s.contact_id = c.id AND s.embedding_model = :target
+    '''), {"target": target}).one()
+    return row.done, row.total
+
+
+def embed_rows(rows, embedder):
+    """Encode contact rows with `embedder` and upsert them into the shadow table."""
+    profiles = [build_profile_string(r.first_name, r.last_name, r.email, r.tags, r.notes) for r in rows]
+    vectors = embedder.encode(profiles, batch_size=len(profiles))
+    db.session.execute(UPSERT_SHADOW_SQL, [{
+        "contact_id": r.id,
+        "embedding_model": embedder.model_name,
+        "embedding": vector,
+        "embedding_coarse": coarse_embedding(vector),
+        "source_embedded_at": r.embedded_at,
+    } for r, vector in zip(rows, vectors)])
+
+
+def reembed(target, batch_size=64, sleep_seconds=0.0, backend=None, report=print):
+    """Fill the shadow table with `target` vectors for every pending row (one pass)."""
+    embedding_dimension(target)  # fail fast on unknown models
+    state = get_state(for_update=True)
+    if target == state.active_model:
+        db.session.rollback()
+        raise ValueError(f"{target} is already the active model")
+    state.target_model = target
+    state.updated_at = datetime.datetime.now(datetime.UTC)
+    db.session.commit()
+
+    embedder = create_embedder(backend=backend, model_name=target)
+    after, processed, started = 0, 0, time.monotonic()
+    while True:
+        rows = db.session.execute(text(PENDING_SQL), {"target": target, "after": after, "batch_size": batch_size}).all()
+        if not rows:
+            break
+        embed_rows(rows, embedder)
+        db.session.commit()
+        after = rows[-1].id
+        processed += len(rows)
+        done, total = coverage(target)
+        report(f"{processed} re-embedded ({processed / (time.monotonic() - started):.1f} rows/s), "
+               f"coverage {done}/{total}")
+        if sleep_seconds:
+            time.sleep(sleep_seconds)  # throttle so the job doesn't starve live traffic
+    return coverage(target)
+
+
+def live_dimension():
+    return db.session.execute(text('''
+        SELECT atttypmod FROM pg_attribute
+        WHERE attrelid = 'public.contact'::regclass AND attname = 'embedding'
+    ''')).scalar()
+
+
+def cutover(max_catch_up=1000, allow_rewrite=False, backend=None, report=print):
+    """Swap the shadow vectors in and make the target model active, atomically."""
+    # Locked first, before the table: writers take the same locks in the same order
+    state = get_state(for_update=True)
+    target = state.target_model
+    if not target:
+        db.session.rollback()
+        raise ValueError("No migration in progress; run `flask embedding-model reembed --target NAME` first")
+
+    rewrite = embedding_dimension(target) != live_dimension()
+    if rewrite and not allow_rewrite:
+        db.session.rollback()
+        raise ValueError(
+            f"{target} has {embedding_dimension(target)} dimensions; changing the column type rewrites "
+            "the table under an exclusive lock. Re-run with --allow-rewrite during a quiet period."
+        )
+
+    # Block writers (not readers) so nothing changes between the final check and the swap
+    db.session.execute(text("LOCK TABLE public.contact IN SHARE ROW EXCLUSIVE MODE"))
+    stragglers = db.session.execute(
+        text(PENDING_SQL), {"target": target, "after": 0, "batch_size": max_catch_up + 1}
+    ).all()
+    if len(stragglers) > max_catch_up:
+        db.session.rollback()
+        raise ValueError(f"More than {max_catch_up} rows still pending; run reembed again first")
+    if stragglers:
+        report(f"Re-embedding {len(stragglers)} rows written since the last pass")
+        embed_rows(stragglers, get_embedder(target) if backend is None else create_embedder(backend, target))
+
+    if rewrite:
+        # Dimension-typed expression indexes can't survive the type change; rebuild them afterwards
+        for name in db.session.execute(text(
+            "SELECT indexname FROM pg_indexes WHERE tablename = 'contact' AND indexname ~ '^contact_embedding_(vector|halfvec|bit)_hnsw$'"
+        )).scalars():
+            db.session.execute(text(f"DROP INDEX public.{name}"))
+            report(f"Dropped {name}; rebuild it with `flask vector-index create`")
+        db.session.execute(text(
+            f"ALTER TABLE public.contact ALTER COLUMN embedding TYPE vector({embedding_dimension(target)}) USING NULL"
+        ))
+
+    swapped = db.session.execute(text('''
+        UPDATE public.contact c
+        SET embedding = s.embedding,
+            embedding_coarse = s.embedding_coarse,
+            embedding_model = s.embedding_model
+        FROM public.contact_embedding_shadow s
+        WHERE s.contact_id = c.id AND s.embedding_model = :target
+    '''), {"target": target}).rowcount
+    state.active_model = target
+    state.target_model = None
+    state.updated_at = datetime.datetime.now(datetime.UTC)
+    db.session.commit()
+    report(f"Cutover complete: {swapped} rows now use {target}")
+
+    db.session.execute(text("DELETE FROM public.contact_embedding_shadow WHERE embedding_model = :target"), {"target": target})
+    db.session.commit()
+    return swapped
+
+
+def abort():
+    """Forget the target model and its shadow vectors; the live column is untouched."""
+    state = get_state(for_update=True)
+    state.target_model = None
+    state.updated_at = datetime.datetime.now(datetime.UTC)
+    db.session.execute(text("DELETE FROM public.contact_embedding_shadow"))
+    db.session.commit()
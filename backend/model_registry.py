@@ -0,0 +1,23 @@
+"""Embedding models the app knows how to run, and the vector dimension each produces.
+
+Vectors from different models live in different spaces, so every stored embedding is
+tagged with its model name and searches only compare vectors from the same model.
+"""
+EMBEDDING_MODELS = {
+    "all-MiniLM-L6-v2": 384,
+    "all-MiniLM-L12-v2": 384,
+    "BAAI/bge-small-en-v1.5": 384,
+    "all-mpnet-base-v2": 768,
+}
+
+
+def embedding_dimension(model_name=None):
+    if model_name is None:
+        # Imported here so the embedder processes can use the registry without the app
+        from config import app
+
+        model_name = app.config["EMBEDDING_MODEL"]
+    try:
+        return EMBEDDING_MODELS[model_name]
+    except KeyError:
+        raise ValueError(f"Unknown embedding model {model_name!r}; add it to EMBEDDING_MODELS") from None
@@ -1,7 +1,87 @@
-from config import db
+from config import app, db
 from sqlalchemy.dialects.postgresql import ARRAY
-from sqlalchemy import TIMESTAMP
+from sqlalchemy import TIMESTAMP, text
+from sqlalchemy.orm import validates
+from pgvector import Vector as PgVector
 from pgvector.sqlalchemy import Vector
+import numpy as np
+from model_registry import embedding_dimension
+
+
+class Float32Vector(Vector):
+    """pgvector column that binds and loads float32 NumPy arrays as-is.
+
+    The stock type converts every value to a text literal; with the psycopg adapters
+    registered in config.py the array is sent in pgvector's binary format instead.
+    """
+    cache_ok = True
+
+    def bind_processor(self, dialect):
+        def process(value):
+            if value is None or isinstance(value, np.ndarray):
+                return value
+            return np.asarray(value, dtype=np.float32)
+        return process
+
+    def result_processor(self, dialect, coltype):
+        def process(value):
+            if value is None:
+                return value
+            if isinstance(value, PgVector):
+                return value.to_numpy()
+            return PgVector.from_text(value).to_numpy()
+        return process
+
+
+def coarse_embedding(embedding, dim=None):
+    """First `dim` dimensions of `embedding`, renormalized to unit length.
+
+    Returns None when the coarse column is disabled (COARSE_EMBEDDING_DIM=0).
+    """
+    dim = app.config["COARSE_EMBEDDING_DIM"] if dim is None else dim
+    if embedding is None or not dim:
+        return None
+    prefix = np.asarray(embedding, dtype=np.float32)[:dim]
+    norm = np.linalg.norm(prefix)
+    return prefix / norm if norm > 0 else prefix
+
+
+def profile_hash_sql(row=""):
+    """md5 of the profile string (embeddings.build_profile_string) computed from the columns.
+
+    `row` prefixes each column, e.g. "NEW." inside a trigger.
+    """
+    return f"""md5(
+    {row}first_name || ' ' || {row}last_name || ' ' || coalesce({row}email, '') || ' '
+    || coalesce(array_to_string({row}tags, ' '), '') || ' ' || coalesce({row}notes, '')
+)"""
+
+
+# The hash is only ever computed in SQL. The trigger keeps profile_hash current on every
+# write and copies it to embedded_hash whenever an embedding is written, so a row edited
+# since it was embedded (in the app or straight in SQL) has embedded_hash <> profile_hash.
+PROFILE_HASH_SQL = profile_hash_sql()
+
+PROFILE_HASH_TRIGGER_SQL = f"""
+CREATE OR REPLACE FUNCTION public.contact_profile_hash() RETURNS trigger AS $$
+BEGIN
+    NEW.profile_hash := {profile_hash_sql("NEW.")};
+    IF NEW.embedding IS NULL THEN
+        NEW.embedded_hash := NULL;
+    ELSIF TG_OP = 'INSERT'
+        OR NEW.embedding IS DISTINCT FROM OLD.embedding
+        OR NEW.embedded_at IS DISTINCT FROM OLD.embedded_at THEN
+        NEW.embedded_hash := NEW.profile_hash;
+    END IF;
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE TRIGGER contact_profile_hash
+    BEFORE INSERT OR UPDATE ON public.contact
+    FOR EACH ROW EXECUTE FUNCTION public.contact_profile_hash();
+"""
+
 
 class Contact(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -12,9 +92,23 @@ class Contact(db.Model):
     notes = db.Column(db.Text, nullable=True)
     # Embedding fields for semantic search
     search_text = db.Column(db.Text, nullable=True)  # Combined profile string for embedding
-    embedding = db.Column(Vector(384), nullable=True)  # Changed from 1536 to 384
+    # Sized from EMBEDDING_MODEL only when create_all() makes the table; after that the column
+    # type is whatever `flask embedding-model cutover` last set it to
+    embedding = db.Column(Float32Vector(embedding_dimension()), nullable=True)  # 384 for all-MiniLM-L6-v2
     embedding_model = db.Column(db.Text, nullable=True)
     embedded_at = db.Column(TIMESTAMP, nullable=True)
+    # Renormalized prefix of `embedding` for the coarse first-pass index (COARSE_EMBEDDING_DIM).
+    # Untyped so the prefix length can change; indexes cast it to a fixed dimension.
+    embedding_coarse = db.Column(Float32Vector(), nullable=True)
+    # PROFILE_HASH_SQL of the current columns, and as of the last embedding write; both set
+    # by the contact_profile_hash trigger
+    profile_hash = db.Column(db.Text, nullable=True)
+    embedded_hash = db.Column(db.Text, nullable=True)
+
+    @validates("embedding")
+    def sync_coarse_embedding(self, key, embedding):
+        self.embedding_coarse = coarse_embedding(embedding)
+        return embedding
 
     def to_json(self):
         return {
@@ -27,4 +121,107 @@ class Contact(db.Model):
             'search_text': self.search_text,
             'embedding_model': self.embedding_model,
             'embedded_at': self.embedded_at
-        }
\ No newline at end of file
+        }
+
+
+class EmbeddingModelState(db.Model):
+    """Single row (id=1): which model `contact.embedding` holds, and any model being migrated to."""
+    __tablename__ = "embedding_model_state"
+    id = db.Column(db.Integer, primary_key=True)
+    active_model = db.Column(db.Text, nullable=False)
+    target_model = db.Column(db.Text, nullable=True)
+    updated_at = db.Column(TIMESTAMP, nullable=True)
+    # Set by `flask backfill-coarse` once every embedded row has a coarse prefix of this size
+    coarse_dim = db.Column(db.Integer, nullable=True)
+
+
+class ContactEmbeddingShadow(db.Model):
+    """Vectors from the target model, filled by the re-embedding job until cutover."""
+    __tablename__ = "contact_embedding_shadow"
+    contact_id = db.Column(db.Integer, db.ForeignKey("contact.id", ondelete="CASCADE"), primary_key=True)
+    embedding_model = db.Column(db.Text, nullable=False)
+    # Untyped: the target model may have a different dimension than the live column
+    embedding = db.Column(Float32Vector(), nullable=False)
+    embedding_coarse = db.Column(Float32Vector(), nullable=True)
+    # contact.embedded_at the vector was built from; a mismatch means the contact changed since
+    source_embedded_at = db.Column(TIMESTAMP, nullable=True)
+
+
+# Column order and Postgres types for binary COPY (types must match the table exactly)
+COPY_COLUMNS = [
+    ("first_name", "varchar"),
+    ("last_name", "varchar"),
+    ("email", "varchar"),
+    ("tags", "varchar[]"),
+    ("notes", "text"),
+    ("search_text", "text"),
+    ("embedding", "vector"),
+    ("embedding_coarse", "vector"),
+    ("embedding_model", "text"),
+    ("embedded_at", "timestamp"),
+]
+
+
+def copy_contacts(rows):
+    """Bulk insert contact dicts with a binary COPY on the current session's connection.
+
+    Runs inside the session transaction, so the caller still decides when to commit.
+    `embedded_at` must be a naive UTC datetime (binary COPY does no timezone conversion).
+    """
+    if not rows:
+        return 0
+    columns = ", ".join(name for name, _ in COPY_COLUMNS)
+    dbapi_connection = db.session.connection().connection.driver_connection
+    with dbapi_connection.cursor() as cur:
+        with cur.copy(f"COPY public.contact ({columns}) FROM STDIN WITH (FORMAT BINARY)") as copy:
+            copy.set_types([pg_type for _, pg_type in COPY_COLUMNS])
+            for row in rows:
+                row = dict(row, embedding_coarse=coarse_embedding(row.get("embedding")))
+                copy.write_row([row.get(name) for name, _ in COPY_COLUMNS])
+    return len(rows)
+
+
+# Columns added after the first release. db.create_all() only creates missing tables,
+# so these are added to existing tables on startup (with the profile hash trigger).
+ADDED_COLUMNS = {
+    "contact": {
+        "embedding_coarse": "vector",
+        "profile_hash": "text",
+        "embedded_hash": "text",
+    },
+    "embedding_model_state": {
+        "coarse_dim": "integer",
+    },
+}
+
+
+# Indexes behind the backfill's pending checks (backfill.STALE_WHERE and OTHER_MODEL_WHERE).
+# The partial one only holds rows that need embedding, so it stays small.
+BACKFILL_INDEXES = [
+    "CREATE INDEX IF NOT EXISTS contact_embedding_stale_idx ON public.contact (id) "
+    "WHERE embedding IS NULL OR embedded_hash IS DISTINCT FROM profile_hash",
+    "CREATE INDEX IF NOT EXISTS contact_embedding_model_idx ON public.contact (embedding_model)",
+]
+
+
+def ensure_columns():
+    # Workers start together; let one of them do the DDL
+    db.session.execute(text("SELECT pg_advisory_xact_lock(hashtext('findtact.ensure_columns'))"))
+    added = False
+    for table, columns in ADDED_COLUMNS.items():
+        existing = set(db.session.execute(text(
+            "SELECT column_name FROM information_schema.columns "
+            "WHERE table_schema = 'public' AND table_name = :table"
+        ), {"table": table}).scalars())
+        for name, ddl in columns.items():
+            if name not in existing:
+                db.session.execute(text(f"ALTER TABLE public.{table} ADD COLUMN IF NOT EXISTS {name} {ddl}"))
+                added = True
+    has_trigger = db.session.execute(text(
+        "SELECT 1 FROM pg_trigger WHERE tgrelid = 'public.contact'::regclass AND tgname = 'contact_profile_hash'"
+    )).first()
+    if not has_trigger or added:
+        db.session.execute(text(PROFILE_HASH_TRIGGER_SQL))
+    for ddl in BACKFILL_INDEXES:
+        db.session.execute(text(ddl))
+    db.session.commit()
@@ -0,0 +1,124 @@
+"""Embedding across several processes, for bulk work (`flask backfill-embeddings`,
+`flask import-contacts`).
+
+One model forward pass only uses so many cores well, so on a big node K processes,
+each holding its own copy of the model with a fixed thread budget (and, by default,
+its own cores), encode K chunks at once. Results are written straight into a shared
+float32 buffer instead of being pickled back to the parent.
+
+Workers import only this module and embedders.py, never config.py: they get the embedder
+settings from the parent rather than building their own app and engine.
+"""
+import contextlib
+import multiprocessing
+import os
+from multiprocessing import shared_memory
+import numpy as np
+from cpu_tuning import BLAS_THREAD_VARS, cpu_slice, pin_to_cpus
+from embedders import build_embedder
+from model_registry import embedding_dimension
+
+_worker_embedder = None
+
+
+@contextlib.contextmanager
+def blas_threads(threads):
+    """Export BLAS_THREAD_VARS=`threads` for child processes started inside the block.
+
+    A spawned worker imports numpy while unpickling its initializer, before any of its own
+    code runs, so the caps have to be in the environment it starts with.
+    """
+    saved = {var: os.environ.get(var) for var in BLAS_THREAD_VARS}
+    os.environ.update({var: str(threads) for var in BLAS_THREAD_VARS})
+    try:
+        yield
+    finally:
+        for var, value in saved.items():
+            if value is None:
+                os.environ.pop(var, None)
+            else:
+                os.environ[var] = value
+
+
+def _init_worker(backend, model_name, settings, processes, slot_counter, pin):
+    global _worker_embedder
+    with slot_counter.get_lock():
+        slot = slot_counter.value
+        slot_counter.value += 1
+    if pin:
+        pin_to_cpus(cpu_slice(slot, processes))
+    _worker_embedder = build_embedder(backend, model_name, **settings)
+
+
+def _encode_chunk(task):
+    shm_name, shape, start, texts, batch_size = task
+    # Pool workers share the parent's resource tracker, which unlinks the segment if the parent dies
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        out = np.ndarray(shape, dtype=np.float32, buffer=shm.buf)
+        out[start:start + len(texts)] = _worker_embedder.encode(texts, batch_size=batch_size)
+        del out
+    finally:
+        shm.close()
+    return len(texts)
+
+
+class ProcessPoolEmbedder:
+    """Embedder-compatible front for a pool of model processes.
+
+    `encode` returns unit-length float32 vectors. Processes start lazily, on the first call.
+    `settings` are build_embedder keyword arguments (embeddings.embedder_settings()); the
+    thread counts in them are replaced by `threads_per_process`.
+    """
+
+    def __init__(self, model_name, processes, backend, settings=None, threads_per_process=1, chunk_size=256,
+                 pin=True):
+        self.model_name = model_name
+        self.dimension = embedding_dimension(model_name)
+        self.processes = processes
+        self.threads_per_process = threads_per_process
+        self.backend = backend
+        self.settings = {
+            **(settings or {}),
+            "intra_op_threads": threads_per_process,
+            "torch_threads": (threads_per_process, 1),
+        }
+        self.chunk_size = chunk_size
+        self.pin = pin and processes <= len(os.sched_getaffinity(0))
+        self._pool = None
+
+    def _get_pool(self):
+        if self._pool is None:
+            # spawn, not fork: forking a parent that already runs torch's thread pools can deadlock
+            ctx = multiprocessing.get_context("spawn")
+            with blas_threads(self.threads_per_process):
+                self._pool = ctx.Pool(
+                    self.processes,
+                    initializer=_init_worker,
+                    initargs=(self.backend, self.model_name, self.settings, self.processes,
+                              ctx.Value("i", 0), self.pin),
+                )
+        return self._pool
+
+    def encode(self, texts, batch_size=32):
+        texts = list(texts)
+        shape = (len(texts), self.dimension)
+        if not texts:
+            return np.empty(shape, dtype=np.float32)
+        shm = shared_memory.SharedMemory(create=True, size=int(np.prod(shape)) * 4)
+        try:
+            tasks = [
+                (shm.name, shape, start, texts[start:start + self.chunk_size], batch_size)
+                for start in range(0, len(texts), self.chunk_size)
+            ]
+            self._get_pool().map(_encode_chunk, tasks, chunksize=1)
+            return np.ndarray(shape, dtype=np.float32, buffer=shm.buf).copy()
+        finally:
+            shm.close()
+            shm.unlink()
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
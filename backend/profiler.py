@@ -0,0 +1,116 @@
+"""Statistical stack-sampling profiler for a live worker.
+
+A background thread reads every other thread's Python stack with sys._current_frames()
+a fixed number of times per second, for a fixed duration. The profiled code runs
+unmodified, so the overhead is the sampling itself: around a percent at the default
+100 Hz. Results are written in the collapsed-stack format ("frame;frame;frame count" per
+line), which flamegraph.pl, speedscope and inferno read directly.
+
+Profiles run in the background and land as files in PROFILE_DIR. A sync gunicorn worker
+handles one request at a time, so a profile has to keep sampling after the request that
+started it returns. Workers share the directory, so any worker can serve the file.
+Only Python frames are visible. Time inside numpy, pandas or torch kernels is charged to
+the Python line that called them.
+"""
+import collections
+import datetime
+import os
+import sys
+import threading
+import time
+
+FILE_SUFFIX = ".collapsed"
+
+# Leaf frames of threads that are waiting, not working, as (file path suffix, function).
+# Only these exact frames count: a leaf named `get` or `wait` elsewhere is busy code.
+IDLE_FRAMES = {
+    ("threading.py", "wait"),  # Condition/Event waits: batcher, pool and timer threads
+    ("queue.py", "get"),
+    ("selectors.py", "select"),  # gthread and ASGI event loops
+    ("socket.py", "accept"),
+    ("concurrent/futures/thread.py", "_worker"),  # executor thread blocked on its work queue
+    ("gunicorn/workers/sync.py", "wait"),  # sync worker's select() between requests
+    ("gunicorn/arbiter.py", "sleep"),
+}
+
+_running = threading.Lock()
+_path_prefixes = None
+
+
+def _short_path(filename):
+    """`filename` relative to the sys.path entry it was imported from."""
+    global _path_prefixes
+    if _path_prefixes is None:
+        _path_prefixes = sorted((os.path.join(os.path.abspath(p), "") for p in sys.path if p), key=len, reverse=True)
+    for prefix in _path_prefixes:
+        if filename.startswith(prefix):
+            return filename[len(prefix):]
+    return filename
+
+
+def is_idle(code):
+    """Whether a thread whose leaf frame runs `code` is waiting rather than working."""
+    filename = code.co_filename.replace(os.sep, "/")
+    return any(
+        code.co_name == function and filename.endswith("/" + suffix) for suffix, function in IDLE_FRAMES
+    )
+
+
+def collapse(frame, thread_name):
+    """One stack as a collapsed-stack key: thread name, then frames from the outermost in."""
+    frames = []
+    while frame is not None:
+        code = frame.f_code
+        frames.append(f"{code.co_name} ({_short_path(code.co_filename)}:{frame.f_lineno})".replace(";", ":"))
+        frame = frame.f_back
+    frames.append(thread_name.replace(";", ":"))
+    return ";".join(reversed(frames))
+
+
+def sample(seconds, interval, include_idle=False):
+    """Sample every other thread's stack each `interval` seconds for `seconds`; returns a Counter."""
+    stacks = collections.Counter()
+    me = threading.get_ident()
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        names = {t.ident: t.name for t in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == me or (not include_idle and is_idle(frame.f_code)):
+                continue
+            stacks[collapse(frame, names.get(ident, str(ident)))] += 1
+        time.sleep(interval)
+    return stacks
+
+
+def write_collapsed(stacks, path):
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        for stack, count in stacks.most_common():
+            f.write(f"{stack} {count}\n")
+    os.replace(tmp, path)  # readers never see a half-written file
+
+
+def start(directory, seconds, interval, include_idle=False):
+    """Profile this process in the background; returns the file name, or None if one is already running."""
+    if not _running.acquire(blocking=False):
+        return None
+    os.makedirs(directory, exist_ok=True)
+    stamp = datetime.datetime.now(datetime.UTC).strftime("%Y%m%dT%H%M%S")
+    name = f"profile-{os.getpid()}-{stamp}{FILE_SUFFIX}"
+
+    def run():
+        try:
+            write_collapsed(sample(seconds, interval, include_idle), os.path.join(directory, name))
+        finally:
+            _running.release()
+
+    threading.Thread(target=run, name="profiler", daemon=True).start()
+    return name
+
+
+def list_profiles(directory):
+    """Finished profile files in `directory`, newest first."""
+    if not os.path.isdir(directory):
+        return []
+    names = [n for n in os.listdir(directory) if n.startswith("profile-") and n.endswith(FILE_SUFFIX)]
+    return sorted(names, key=lambda n: os.path.getmtime(os.path.join(directory, n)), reverse=True)
@@ -0,0 +1,134 @@
+"""Capture query plans for slow vector searches.
+
+Views decorated with `sample_queries` have a QUERY_SAMPLE_RATE share of their requests
+sampled. In a sampled request, every SELECT slower than SLOW_QUERY_MS is run again under
+EXPLAIN (ANALYZE, BUFFERS), on the same connection and inside the same transaction, so
+settings such as hnsw.ef_search are the ones the query saw. The plans go into a ring buffer
+of the latest SLOW_QUERY_BUFFER captures, served at /admin/slow_queries. Each entry records
+whether an HNSW index was used, which shows when the planner fell back to a sequential
+scan.
+
+EXPLAIN ANALYZE executes the query again, so a captured request takes about twice as long.
+Keep the rate low in production.
+"""
+import datetime
+import functools
+import random
+import re
+import threading
+import time
+from collections import deque
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+import metrics
+
+SAMPLED = metrics.counter("db_sampled_queries_total", "Queries timed by slow-query sampling")
+CAPTURED = metrics.counter("db_slow_queries_captured_total", "Sampled queries over SLOW_QUERY_MS whose plan was captured")
+
+INDEX_SCAN = re.compile(r"Index (?:Only )?Scan using (\S+)")
+
+_lock = threading.Lock()
+_captured = deque(maxlen=50)
+
+
+def sample_queries(view):
+    """Sample this view's queries for slow-query capture (see QUERY_SAMPLE_RATE)."""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        rate = current_app.config["QUERY_SAMPLE_RATE"]
+        g.sample_queries = rate > 0 and random.random() < rate
+        return view(*args, **kwargs)
+    return wrapper
+
+
+def captured_plans():
+    """The captured plans, newest first."""
+    with _lock:
+        return list(reversed(_captured))
+
+
+def clear():
+    with _lock:
+        _captured.clear()
+
+
+def _sampling():
+    return has_request_context() and g.get("sample_queries", False)
+
+
+def explain(cursor, statement, parameters):
+    """EXPLAIN (ANALYZE, BUFFERS) `statement` on the cursor's connection; returns (plan, ef_search).
+
+    Runs in a savepoint, so a failure (a statement timeout, say) leaves the request's
+    transaction usable.
+    """
+    cur = cursor.connection.cursor()
+    try:
+        cur.execute("SAVEPOINT explain_sample")
+        try:
+            cur.execute("SELECT current_setting('hnsw.ef_search', true)")
+            ef_search = cur.fetchone()[0]
+            cur.execute("EXPLAIN (ANALYZE, BUFFERS) " + statement, parameters)
+            plan = "\n".join(row[0] for row in cur.fetchall())
+        except Exception:
+            cur.execute("ROLLBACK TO SAVEPOINT explain_sample")
+            raise
+        finally:
+            cur.execute("RELEASE SAVEPOINT explain_sample")
+    finally:
+        cur.close()
+    return plan, ef_search
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _sample_started(conn, cursor, statement, parameters, context, executemany):
+    if _sampling():
+        conn.info.setdefault("sample_started", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _sample_finished(conn, cursor, statement, parameters, context, executemany):
+    if not _sampling() or not conn.info.get("sample_started"):
+        return
+    elapsed = time.perf_counter() - conn.info["sample_started"].pop()
+    # Only real queries: skip writes and the set_config() calls that precede searches
+    if executemany or not statement.lstrip().upper().startswith("SELECT") or "set_config(" in statement:
+        return
+    route = request.url_rule.rule if request.url_rule else "unmatched"
+    SAMPLED.inc(route=route)
+    if elapsed * 1000 < current_app.config["SLOW_QUERY_MS"]:
+        return
+
+    try:
+        plan, ef_search = explain(cursor, statement, parameters)
+    except Exception:
+        current_app.logger.exception("EXPLAIN of a slow %s query failed", route)
+        return
+    CAPTURED.inc(route=route)
+    indexes = INDEX_SCAN.findall(plan)
+    entry = {
+        "captured_at": datetime.datetime.now(datetime.UTC).isoformat(),
+        "route": route,
+        "duration_ms": round(elapsed * 1000, 2),
+        "statement": statement,
+        "limit": parameters.get("limit") if isinstance(parameters, dict) else None,
+        "ef_search": ef_search,
+        "indexes": indexes,
+        "used_hnsw": any(name.endswith("_hnsw") for name in indexes),
+        "plan": plan,
+    }
+    with _lock:
+        _captured.append(entry)
+
+
+@event.listens_for(Engine, "handle_error")
+def _sample_failed(context):
+    if context.connection is not None and context.connection.info.get("sample_started"):
+        context.connection.info["sample_started"].pop()
+
+
+def init_app(app):
+    global _captured
+    with _lock:
+        _captured = deque(_captured, maxlen=app.config["SLOW_QUERY_BUFFER"])
@@ -0,0 +1,187 @@
+from config import app, db
+from embeddings import coarse_search_dim
+from models import coarse_embedding
+from model_registry import embedding_dimension
+from sqlalchemy import text
+
+# Columns returned by every vector search, in the shape the endpoints serialize
+CONTACT_COLUMNS = """
+    id,
+    first_name,
+    last_name,
+    email,
+    tags,
+    notes,
+    search_text,
+    embedding_model,
+    embedded_at
+"""
+
+INDEX_MODES = ["exact", "vector", "halfvec", "bit"]
+
+# Transaction-local, so it never outlives the query (safe behind a transaction pooler)
+EF_SEARCH_SQL = text("SELECT set_config('hnsw.ef_search', :ef_search, true)")
+
+
+def ann_expressions(mode, dim, coarse_dim=0):
+    """(ORDER BY distance, HNSW index definition) for the candidate pass.
+
+    `dim` is the dimension of the model whose vectors are searched (model_registry), which
+    a cutover may change; the quantized casts are typed with it.
+    The distance must match the index expression exactly for the planner to use the index.
+    The quantized ones are expression indexes, so existing rows need no rewrite to use them.
+    With `coarse_dim` the pass runs over the truncated `embedding_coarse` column instead;
+    those indexes are partial on coarse_filter(coarse_dim), which the queries repeat.
+    """
+    if coarse_dim:
+        column, query, dim = "embedding_coarse", ":coarse_query", coarse_dim
+        vector_distance = f"embedding_coarse::vector({dim}) <=> CAST(:coarse_query AS vector({dim}))"
+        vector_index = f"(embedding_coarse::vector({dim})) vector_cosine_ops"
+    else:
+        column, query = "embedding", ":query_embedding"
+        vector_distance = "embedding <=> :query_embedding"
+        vector_index = "embedding vector_cosine_ops"
+
+    if mode == "halfvec":
+        return (
+            f"{column}::halfvec({dim}) <=> CAST({query} AS halfvec({dim}))",
+            f"({column}::halfvec({dim})) halfvec_cosine_ops",
+        )
+    if mode == "bit":
+        return (
+            f"binary_quantize({column})::bit({dim}) <~> binary_quantize({query})",
+            f"(binary_quantize({column})::bit({dim})) bit_hamming_ops",
+        )
+    return vector_distance, vector_index
+
+
+def coarse_filter(coarse_dim):
+    """Rows whose coarse prefix has `coarse_dim` dimensions; the cast to vector(coarse_dim) fails on any other.
+
+    A literal, not a parameter, so the planner can match it to the partial index predicate.
+    """
+    return f"vector_dims(embedding_coarse) = {int(coarse_dim)}"
+
+
+def index_name(mode, coarse_dim=0):
+    if coarse_dim:
+        return f"contact_embedding_coarse{coarse_dim}_{mode}_hnsw"
+    return f"contact_embedding_{mode}_hnsw"
+
+
+def is_two_stage(mode, coarse_dim):
+    return bool(coarse_dim) or mode in ("halfvec", "bit")
+
+
+def build_candidates_sql(mode, dim, coarse_dim=0, columns="id", exclude_id=False):
+    """Inner query returning :candidates rows ranked by the cheap candidate distance."""
+    if mode not in INDEX_MODES:
+        raise ValueError(f"Unknown vector index mode: {mode}")
+    distance, _ = ann_expressions(mode, dim, coarse_dim)
+    present = f"embedding_coarse IS NOT NULL AND {coarse_filter(coarse_dim)}" if coarse_dim else "embedding IS NOT NULL"
+    exclude = "AND id <> :exclude_id" if exclude_id else ""
+    return f'''
+        SELECT {columns}
+        FROM public.contact
+        WHERE {present} AND embedding_model = :embedding_model {exclude}
+        ORDER BY {distance}
+        LIMIT :candidates
+    '''
+
+
+def build_search_sql(mode, dim, coarse_dim=0):
+    """SQL for a top-k cosine search under the given index mode.
+
+    "exact" and "vector" rank on the float32 column directly. "halfvec", "bit" and any
+    coarse configuration fetch :candidates rows through the cheaper pass, then rescore
+    them exactly against the full float32 embedding.
+    """
+    if mode not in INDEX_MODES:
+        raise ValueError(f"Unknown vector index mode: {mode}")
+
+    if not is_two_stage(mode, coarse_dim):
+        return text(f'''
+            SELECT {CONTACT_COLUMNS},
+                (1 - (embedding <=> :query_embedding)) AS similarity
+            FROM public.contact
+            WHERE embedding IS NOT NULL AND embedding_model = :embedding_model
+            ORDER BY embedding <=> :query_embedding
+            LIMIT :limit
+        ''')
+
+    candidates = build_candidates_sql(mode, dim, coarse_dim, columns=f"{CONTACT_COLUMNS}, embedding")
+    return text(f'''
+        SELECT {CONTACT_COLUMNS},
+            (1 - (embedding <=> :query_embedding)) AS similarity
+        FROM ({candidates}) AS candidates
+        WHERE embedding IS NOT NULL
+        ORDER BY embedding <=> :query_embedding
+        LIMIT :limit
+    ''')
+
+
+def ef_search_for(limit):
+    """hnsw.ef_search needed for HNSW to return `limit` rows."""
+    return max(app.config["HNSW_EF_SEARCH"], limit)
+
+
+def set_ef_search(limit):
+    """Raise hnsw.ef_search for this transaction only so HNSW can return `limit` rows."""
+    db.session.execute(EF_SEARCH_SQL, {"ef_search": str(ef_search_for(limit))})
+
+
+def prepare_search(query_embedding, limit, model_name, mode=None, coarse_dim=None):
+    """(SQL, params, ef_search) for a top-k search; ef_search is None in exact mode.
+
+    Shared by search_contacts and the async search in asgi.py. `coarse_dim` defaults to
+    coarse_search_dim(): 0 (the full-vector path) until the coarse backfill is complete.
+    """
+    mode = mode or app.config["VECTOR_INDEX_MODE"]
+    coarse_dim = coarse_search_dim() if coarse_dim is None else coarse_dim
+    candidates = max(limit, app.config["ANN_CANDIDATES"])
+    two_stage = is_two_stage(mode, coarse_dim)
+    ef_search = None if mode == "exact" else ef_search_for(candidates if two_stage else limit)
+
+    params = {
+        "query_embedding": query_embedding,
+        "embedding_model": model_name,
+        "limit": limit,
+        "candidates": candidates,
+    }
+    if coarse_dim:
+        params["coarse_query"] = coarse_embedding(query_embedding, coarse_dim)
+    return build_search_sql(mode, embedding_dimension(model_name), coarse_dim), params, ef_search
+
+
+def search_contacts(query_embedding, limit, model_name, mode=None, coarse_dim=None):
+    """Return the `limit` contacts closest to `query_embedding` as row mappings.
+
+    Only rows embedded by `model_name` (the model that encoded the query) are compared.
+    """
+    sql, params, ef_search = prepare_search(query_embedding, limit, model_name, mode, coarse_dim)
+    if ef_search is not None:
+        db.session.execute(EF_SEARCH_SQL, {"ef_search": str(ef_search)})
+    return db.session.execute(sql, params).mappings().all()
+
+
+def similar_candidate_ids(embedding, model_name, exclude_id, limit, mode=None):
+    """Ids of the contacts nearest `embedding` by the coarse pass, for exact rescoring.
+
+    Returns None when no coarse column is configured, or its backfill isn't complete,
+    meaning "compare against everyone".
+    """
+    mode = mode or app.config["VECTOR_INDEX_MODE"]
+    coarse_dim = coarse_search_dim()
+    if not coarse_dim:
+        return None
+    candidates = max(limit, app.config["ANN_CANDIDATES"])
+    if mode != "exact":
+        set_ef_search(candidates)
+
+    sql = text(build_candidates_sql(mode, embedding_dimension(model_name), coarse_dim, exclude_id=True))
+    return db.session.execute(sql, {
+        "coarse_query": coarse_embedding(embedding, coarse_dim),
+        "embedding_model": model_name,
+        "exclude_id": exclude_id,
+        "candidates": candidates,
+    }).scalars().all()
@@ -0,0 +1,89 @@
+"""The Embedder contract: unit-length float32 arrays of shape (n, dimension), (0, dimension) when empty.
+
+embedders.py doesn't import the app's config, so these run without a database. The
+ONNX parity test needs onnxruntime, transformers, sentence-transformers and an export
+(`flask --app main embedder export-onnx`); it is skipped without them.
+"""
+import importlib.util
+import os
+import sys
+
+import numpy as np
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+import embedders  # noqa: E402
+from embedders import MODEL_NAME, RandomEmbedder, build_embedder  # noqa: E402
+
+ONNX_DIR = os.path.join(BACKEND_DIR, os.environ.get("EMBEDDER_ONNX_DIR", "onnx/all-MiniLM-L6-v2"))
+
+TEXTS = [
+    "Maya Thompson maya.thompson@example.com neighbor kids Lives in Apt 3B.",
+    "Sam Patel sam.patel@example.com landlord repairs Text for urgent repairs (leaks, heating).",
+    "gym weekend coffee",
+    "naïve café écrivain",
+    "",
+]
+
+
+def assert_contract(embedder, texts):
+    vectors = embedder.encode(texts)
+    assert vectors.dtype == np.float32
+    assert vectors.shape == (len(texts), embedder.dimension)
+    if texts:
+        np.testing.assert_allclose(np.linalg.norm(vectors, axis=1), 1.0, rtol=1e-5)
+    return vectors
+
+
+@pytest.mark.parametrize("model_name", ["all-MiniLM-L6-v2", "all-mpnet-base-v2"])
+def test_random_embedder_contract(model_name):
+    embedder = RandomEmbedder(model_name)
+    assert embedder.model_name == model_name
+    vectors = assert_contract(embedder, TEXTS)
+    assert_contract(embedder, [])
+    # Deterministic per text, whatever the batch
+    np.testing.assert_array_equal(embedder.encode(TEXTS[2:3])[0], vectors[2])
+    assert not np.array_equal(vectors[0], vectors[1])
+
+
+def test_build_embedder_random():
+    embedder = build_embedder("random", "all-mpnet-base-v2")
+    assert isinstance(embedder, RandomEmbedder)
+    assert embedder.dimension == 768
+
+
+def test_build_embedder_rejects_unknown_backend():
+    with pytest.raises(ValueError, match="Unknown EMBEDDER_BACKEND"):
+        build_embedder("tensorflow", MODEL_NAME)
+
+
+def test_build_embedder_rejects_another_models_vectors(monkeypatch):
+    class OtherModelServer(RandomEmbedder):
+        def __init__(self, url, timeout=10):
+            super().__init__("all-mpnet-base-v2")
+
+    monkeypatch.setattr(embedders, "RemoteEmbedder", OtherModelServer)
+    with pytest.raises(ValueError, match="serves 'all-mpnet-base-v2', not 'all-MiniLM-L6-v2'"):
+        build_embedder("remote", "all-MiniLM-L6-v2", url="http://127.0.0.1:5100")
+    assert build_embedder("remote", "all-mpnet-base-v2", url="http://127.0.0.1:5100").dimension == 768
+
+
+@pytest.mark.parametrize("quantized", [False, True])
+def test_onnx_matches_torch(quantized):
+    for module in ("onnxruntime", "transformers", "sentence_transformers"):
+        if importlib.util.find_spec(module) is None:
+            pytest.skip(f"{module} is not installed")
+    model_file = embedders.ONNX_QUANTIZED_FILE if quantized else embedders.ONNX_MODEL_FILE
+    if not os.path.exists(os.path.join(ONNX_DIR, model_file)):
+        pytest.skip(f"no ONNX export in {ONNX_DIR}")
+
+    onnx_embedder = build_embedder("onnx", MODEL_NAME, onnx_dir=ONNX_DIR, onnx_quantized=quantized)
+    torch_embedder = build_embedder("torch", MODEL_NAME)
+    candidate = assert_contract(onnx_embedder, TEXTS)
+    reference = assert_contract(torch_embedder, TEXTS)
+    assert_contract(onnx_embedder, [])
+    assert_contract(torch_embedder, [])
+    # The same floor `flask embedder parity` uses by default
+    assert (reference * candidate).sum(axis=1).min() >= 0.99
@@ -0,0 +1,149 @@
+"""embedding_server.py and its client, embedders.RemoteEmbedder, over a real HTTP connection.
+
+The server runs in-process (serve_in_thread) around a RandomEmbedder, so no model or
+database is needed.
+"""
+import json
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.client import HTTPConnection
+from urllib.parse import urlsplit
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from embedders import RandomEmbedder, RemoteEmbedder  # noqa: E402
+from embedding_server import EmbeddingRequestHandler, serve_in_thread  # noqa: E402
+
+TEXTS = ["Maya Thompson neighbor kids", "Sam Patel landlord repairs", "gym weekend coffee", "naïve café", ""]
+
+
+class RecordingEmbedder(RandomEmbedder):
+    """RandomEmbedder that records the size of every batch it encodes."""
+
+    def __init__(self, model_name="all-MiniLM-L6-v2"):
+        super().__init__(model_name)
+        self.batches = []
+
+    def encode(self, texts, batch_size=32):
+        texts = list(texts)
+        self.batches.append(len(texts))
+        return super().encode(texts, batch_size)
+
+
+class FailingEmbedder(RandomEmbedder):
+    def encode(self, texts, batch_size=32):
+        raise RuntimeError("model crashed")
+
+
+@pytest.fixture
+def serve():
+    servers = []
+
+    def start(embedder, **kwargs):
+        server, url = serve_in_thread(embedder, **kwargs)
+        servers.append(server)
+        return server, url
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def post(url, body):
+    parts = urlsplit(url)
+    conn = HTTPConnection(parts.hostname, parts.port, timeout=10)
+    try:
+        conn.request("POST", "/embed", body=body, headers={"Content-Type": "application/json"})
+        response = conn.getresponse()
+        return response.status, response.read()
+    finally:
+        conn.close()
+
+
+def test_remote_vectors_match_the_local_embedder(serve):
+    local = RandomEmbedder("all-mpnet-base-v2")
+    _, url = serve(local)
+    remote = RemoteEmbedder(url)
+    assert (remote.model_name, remote.dimension) == ("all-mpnet-base-v2", 768)
+    vectors = remote.encode(TEXTS)
+    assert vectors.dtype == np.float32
+    np.testing.assert_array_equal(vectors, local.encode(TEXTS))
+
+
+def test_empty_batch_has_shape_zero_by_dimension(serve):
+    _, url = serve(RandomEmbedder())
+    assert post(url, json.dumps({"texts": []}).encode()) == (200, b"")
+    assert RemoteEmbedder(url).encode([]).shape == (0, 384)
+
+
+def test_concurrent_requests_share_forward_passes(serve):
+    embedder = RecordingEmbedder()
+    # A wide window, so requests from all threads land in the same few batches
+    _, url = serve(embedder, max_batch_size=64, max_wait_ms=200)
+    remote = RemoteEmbedder(url)
+    texts = [f"contact {i}" for i in range(32)]
+    start = threading.Barrier(len(texts))
+
+    def encode_one(text):
+        start.wait()
+        return remote.encode([text])[0]
+
+    with ThreadPoolExecutor(len(texts)) as pool:
+        vectors = np.stack(list(pool.map(encode_one, texts)))
+
+    np.testing.assert_array_equal(vectors, RandomEmbedder().encode(texts))
+    assert sum(embedder.batches) == len(texts)
+    assert max(embedder.batches) > 1
+    assert len(embedder.batches) < len(texts)
+
+
+@pytest.mark.parametrize("body", [
+    b"not json",
+    b'{"text": ["a"]}',
+    b'{"texts": "a"}',
+    b'{"texts": ["a", 1]}',
+    b'["a"]',
+])
+def test_malformed_requests_get_400(serve, body):
+    _, url = serve(RandomEmbedder())
+    status, data = post(url, body)
+    assert status == 400
+    assert "message" in json.loads(data)
+
+
+def test_encode_failures_get_500_and_are_not_retried(serve):
+    _, url = serve(FailingEmbedder())
+    status, data = post(url, json.dumps({"texts": ["a"]}).encode())
+    assert status == 500
+    assert json.loads(data) == {"message": "Encoding failed."}
+    with pytest.raises(RuntimeError, match="returned 500"):
+        RemoteEmbedder(url).encode(["a"])
+
+
+def test_client_retries_once_when_the_server_dropped_its_keep_alive_connection(serve):
+    connections = []
+
+    class ClosingHandler(EmbeddingRequestHandler):
+        """Closes the connection after each embed without saying so, like an idle timeout."""
+
+        def setup(self):
+            connections.append(self.client_address)
+            super().setup()
+
+        def do_POST(self):
+            super().do_POST()
+            self.close_connection = True
+
+    server, url = serve(RandomEmbedder())
+    server.RequestHandlerClass = ClosingHandler
+    remote = RemoteEmbedder(url)
+    first = remote.encode(TEXTS[:2])
+    second = remote.encode(TEXTS[2:])  # its kept-alive connection is gone by now
+    np.testing.assert_array_equal(np.vstack([first, second]), RandomEmbedder().encode(TEXTS))
+    assert len(connections) == 2
@@ -0,0 +1,96 @@
+"""The profile hash computed in SQL must match the profile string the app embeds.
+
+Needs a Postgres database with pgvector: TEST_DATABASE_URL=postgresql://... pytest tests
+Everything runs in one transaction that is rolled back.
+"""
+import hashlib
+import os
+import sys
+
+import numpy as np
+import pytest
+
+TEST_DATABASE_URL = os.environ.get("TEST_DATABASE_URL")
+pytestmark = pytest.mark.skipif(not TEST_DATABASE_URL, reason="TEST_DATABASE_URL is not set")
+
+CASES = [
+    # first_name, last_name, email, tags, notes
+    ("Ada", "Lovelace", "ada@example.com", ["math", "engines"], "Met at the 1842 lecture"),
+    ("Ada", "Byron", None, None, None),
+    ("Grace", "Hopper", "", [], ""),
+    ("Alan", "Turing", "alan@example.com", ["one"], 1.5),
+    ("Émile", "Zola", "emile@example.com", ["écrivain", "paris"], "naïve café"),
+]
+
+
+@pytest.fixture(scope="module")
+def app():
+    os.environ["DATABASE_URL"] = TEST_DATABASE_URL
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from config import app, db
+    from models import ensure_columns
+
+    with app.app_context():
+        db.create_all()
+        ensure_columns()
+    return app
+
+
+@pytest.fixture
+def session(app):
+    from config import db
+
+    with app.app_context():
+        yield db.session
+        db.session.rollback()
+
+
+def insert_cases(session):
+    from embeddings import build_profile_string
+    from models import Contact
+
+    contacts = []
+    for i, (first, last, email, tags, notes) in enumerate(CASES):
+        contact = Contact(
+            first_name=first,
+            last_name=last,
+            # email is NOT NULL in the table
+            email=f"profile-hash-test-{i}@example.com" if email is None else email,
+            tags=tags,
+            notes=None if notes is None else str(notes),  # as stored by the CSV import
+            embedding=np.ones(384, dtype=np.float32) / np.sqrt(384),
+            embedding_model="all-MiniLM-L6-v2",
+        )
+        contact.search_text = build_profile_string(first, last, contact.email, tags, notes)
+        session.add(contact)
+        contacts.append(contact)
+    session.flush()
+    return contacts
+
+
+def test_sql_hash_matches_python_profile_string(session):
+    from sqlalchemy import text
+    from models import PROFILE_HASH_SQL
+
+    contacts = insert_cases(session)
+    for contact in contacts:
+        row = session.execute(text(
+            f"SELECT profile_hash, embedded_hash, {PROFILE_HASH_SQL} AS computed FROM public.contact WHERE id = :id"
+        ), {"id": contact.id}).one()
+        expected = hashlib.md5(contact.search_text.encode("utf-8")).hexdigest()
+        assert row.computed == expected, contact.search_text
+        assert row.profile_hash == expected, contact.search_text
+        assert row.embedded_hash == expected, contact.search_text
+
+
+def test_embedded_rows_are_not_pending_until_edited_in_sql(session):
+    from sqlalchemy import text
+    from backfill import PENDING_WHERE
+
+    ids = [c.id for c in insert_cases(session)]
+    pending = text(f"SELECT id FROM public.contact WHERE id = ANY(:ids) AND {PENDING_WHERE}")
+    params = {"ids": ids, "active_model": "all-MiniLM-L6-v2"}
+    assert session.execute(pending, params).scalars().all() == []
+
+    session.execute(text("UPDATE public.contact SET notes = 'edited' WHERE id = :id"), {"id": ids[0]})
+    assert session.execute(pending, params).scalars().all() == [ids[0]]